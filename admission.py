@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import logging
+
+from query_cache import normalize_query
+from metrics import ADMISSIONS, ADMISSION_WAIT
+
+logger = logging.getLogger("TheWatcher")
+
+ADMISSION_WORKERS = int(os.getenv("ADMISSION_WORKERS", "4"))        # interactions answered at once
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "32"))           # admitted interactions waiting for a worker
+ADMISSION_LLM_RATE = float(os.getenv("ADMISSION_LLM_RATE", "0.5"))  # Groq calls/sec across all users (30 RPM)
+ADMISSION_LLM_BURST = int(os.getenv("ADMISSION_LLM_BURST", "10"))
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", str(1 / 15)))  # questions/sec per user
+ADMISSION_USER_BURST = int(os.getenv("ADMISSION_USER_BURST", "3"))
+DEGRADE_QUEUE_DEPTH = int(os.getenv("ADMISSION_DEGRADE_DEPTH", str(ADMISSION_QUEUE // 4)))  # backlog that turns off the rewrite
+MAX_USER_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Refills `rate` tokens/sec up to `capacity`. Event-loop only, so no lock."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+    def try_take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    async def take(self):
+        while not self.try_take():
+            await asyncio.sleep(self.wait_time())
+
+
+class Admission:
+    """
+    Admission control in front of the answer pipeline.
+    - Each user has a token bucket; an empty one rejects the interaction right away.
+    - An interaction whose normalized question is already queued or being answered joins it
+      instead of costing another rewrite + completion; handler(waiters) answers all of them.
+    - Admitted questions wait in a bounded queue for one of `workers` tasks; a full queue rejects.
+    - The global bucket paces Groq calls. The completion waits for a token; the optional query
+      rewrite is skipped when no token is free or the backlog is past degrade_depth.
+    The worker tasks start on the first submit() and outlive the request that started them, so this
+    needs a long-running process; a serverless instance can be frozen as soon as the response is sent.
+    """
+
+    def __init__(self, handler, workers=ADMISSION_WORKERS, queue_size=ADMISSION_QUEUE, llm_rate=ADMISSION_LLM_RATE,
+                 llm_burst=ADMISSION_LLM_BURST, user_rate=ADMISSION_USER_RATE, user_burst=ADMISSION_USER_BURST,
+                 degrade_depth=DEGRADE_QUEUE_DEPTH):
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.llm = TokenBucket(llm_rate, llm_burst)
+        self.user_rate, self.user_burst = user_rate, user_burst
+        self.degrade_depth = degrade_depth
+        self.users = {}
+        self.in_flight = {}  # normalized question -> waiters; the first is the one being answered
+        self.queue = None
+        self.tasks = []
+
+    def _user_bucket(self, user_id):
+        if len(self.users) > MAX_USER_BUCKETS:
+            # A full bucket is the same as a fresh one, so those can go
+            self.users = {user: bucket for user, bucket in self.users.items() if not bucket.full}
+        return self.users.setdefault(user_id, TokenBucket(self.user_rate, self.user_burst))
+
+    def _start(self):
+        # Created on first use, inside the running loop
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.tasks = [asyncio.get_running_loop().create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, user_id, question, waiter):
+        """(decision, retry_after seconds). decision: queued | coalesced | rejected_user | rejected_busy."""
+        if self.queue is None:
+            self._start()
+        bucket = self._user_bucket(user_id)
+        if not bucket.try_take():
+            return self._decide("rejected_user", bucket.wait_time())
+        key = normalize_query(question)
+        if key in self.in_flight:
+            self.in_flight[key].append(waiter)
+            return self._decide("coalesced")
+        if self.queue.full():
+            return self._decide("rejected_busy", self.queue.qsize() / self.llm.rate)
+        self.in_flight[key] = [waiter]
+        self.queue.put_nowait((key, time.perf_counter()))
+        return self._decide("queued")
+
+    @staticmethod
+    def _decide(decision, retry_after=0.0):
+        ADMISSIONS.inc(decision=decision)
+        return decision, retry_after
+
+    def allow_optional_call(self):
+        """True if there is headroom for an LLM call the answer can do without (the query rewrite)."""
+        if self.queue is not None and self.queue.qsize() >= self.degrade_depth:
+            allowed = False
+        else:
+            allowed = self.llm.try_take()
+        if not allowed:
+            ADMISSIONS.inc(decision="degraded")
+        return allowed
+
+    async def llm_call(self):
+        """Waits for the global bucket before a call the answer needs (the completion)."""
+        await self.llm.take()
+
+    async def _worker(self):
+        while True:
+            key, queued_at = await self.queue.get()
+            ADMISSION_WAIT.observe(time.perf_counter() - queued_at)
+            try:
+                # Waiters that join while this runs are in the same list, so handler() answers them too
+                await self.handler(self.in_flight[key])
+            except Exception as e:
+                logger.error(f"Admission worker error: {e}")
+            finally:
+                del self.in_flight[key]
+                self.queue.task_done()
@@ -0,0 +1,84 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+from query_cache import normalize_query
+
+logger = logging.getLogger("TheWatcher")
+
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "answer_cache.sqlite3")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+
+def answer_key(query, chunk_ids):
+    # Same question + same retrieved chunks -> same prompt -> same answer
+    material = normalize_query(query) + "\n" + ",".join(sorted(str(chunk) for chunk in chunk_ids))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """SQLite store of final answers, indexed by the source URLs they were built from."""
+
+    def __init__(self, path=ANSWER_CACHE_PATH, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, last_used REAL);
+            CREATE TABLE IF NOT EXISTS answer_sources (key TEXT, url TEXT);
+            CREATE INDEX IF NOT EXISTS answer_sources_url ON answer_sources (url);
+            CREATE INDEX IF NOT EXISTS answer_sources_key ON answer_sources (key);
+            CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+        """)
+        self.db.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.db.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.db.commit()
+        return row[0] if row else None
+
+    def put(self, key, answer, urls):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)", (key, answer, time.time()))
+            self.db.execute("DELETE FROM answer_sources WHERE key = ?", (key,))
+            self.db.executemany("INSERT INTO answer_sources VALUES (?, ?)", [(key, url) for url in set(urls)])
+            self._evict()
+            self.db.commit()
+
+    def invalidate_urls(self, urls):
+        urls = list(set(urls))
+        if not urls:
+            return 0
+        with self.lock:
+            removed = 0
+            for start in range(0, len(urls), 500):
+                batch = urls[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                keys = f"SELECT key FROM answer_sources WHERE url IN ({marks})"
+                removed += self.db.execute(f"DELETE FROM answers WHERE key IN ({keys})", batch).rowcount
+                self.db.execute(f"DELETE FROM answer_sources WHERE key IN ({keys})", batch)
+            self.db.commit()
+        return removed
+
+    def _evict(self):
+        (count,) = self.db.execute("SELECT COUNT(*) FROM answers").fetchone()
+        if count > self.max_entries:
+            self.db.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            self.db.execute("DELETE FROM answer_sources WHERE key NOT IN (SELECT key FROM answers)")
+
+
+def open_answer_cache():
+    try:
+        return AnswerCache()
+    except sqlite3.Error as e:
+        logger.error(f"Answer cache disabled: {e}")
+        return None
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import resource
+import tracemalloc
+import requests
+from dotenv import load_dotenv
+from chunking import chunk_text
+from extractor import extract_text, discover_internal_links, USER_AGENT
+
+load_dotenv()
+
+CORPUS_DIR = "bench_corpus"
+CORPUS_URLS = "urls.json"
+
+
+def fetch_corpus(corpus_dir, limit=300):
+    """Saves the seed pages from ITU_LINKS plus their sub-pages as raw HTML, one file per URL."""
+    seeds = [url.strip() for url in os.getenv("ITU_LINKS", "").split(",") if url.strip()]
+    urls = set(seeds)
+    for seed in seeds:
+        urls.update(discover_internal_links(seed))
+    os.makedirs(corpus_dir, exist_ok=True)
+    saved = 0
+    names = {}
+    for url in sorted(urls)[:limit]:
+        try:
+            response = requests.get(url, headers={'User-Agent': USER_AGENT}, timeout=30)
+        except requests.RequestException as e:
+            print(f"   ! {url}: {e}")
+            continue
+        if response.status_code != 200:
+            continue
+        name = hashlib.sha1(url.encode()).hexdigest()[:16] + ".html"
+        with open(os.path.join(corpus_dir, name), "wb") as f:
+            f.write(response.content)
+        names[name] = url
+        saved += 1
+    # File name -> source URL, so inspect_data.py can score retrieval against labeled URLs
+    with open(os.path.join(corpus_dir, CORPUS_URLS), "w", encoding="utf-8") as f:
+        json.dump(names, f, indent=1)
+    print(f"Saved {saved} pages to {corpus_dir}/")
+
+
+def legacy_extract_text(content):
+    # The BeautifulSoup html.parser path this module replaced, kept for --compare
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    for pricing in soup.select(".fusion-pricing-table"):
+        headers = [h.get_text(strip=True) for h in pricing.select(".panel-heading")]
+        prices = [p.get_text(strip=True) for p in pricing.select(".panel-body")]
+        features = [f.get_text(strip=True) for f in pricing.select(".list-group-item")]
+        pricing.replace_with(f"\n=== FEE/PRICING DATA ===\nPlans: {', '.join(headers)}\nPrices: {', '.join(prices)}\nDetails: {', '.join(features)}\n========================\n")
+    for table in soup.find_all("table"):
+        table_str = "\n--- TABLE DATA ---\n"
+        for row in table.find_all("tr"):
+            table_str += " | ".join(ele.get_text(strip=True) for ele in row.find_all(["td", "th"])) + "\n"
+        table_str += "------------------\n"
+        table.replace_with(table_str)
+    for selector in [".fusion-footer", ".fusion-header-wrapper", "#sliders-container", ".fusion-sliding-bar", ".fusion-page-title-bar", "#side-header", ".fusion-sharing-box", "script", "style", "iframe", "form", "nav"]:
+        for element in soup.select(selector):
+            element.decompose()
+    main_content = soup.find(id="main")
+    return main_content.get_text(separator="\n") if main_content else soup.get_text(separator="\n")
+
+
+def run(name, extract, pages, repeat):
+    tracemalloc.start()
+    started = time.perf_counter()
+    chunks = 0
+    for _ in range(repeat):
+        for path, content in pages:
+            chunks += len(chunk_text(extract(content), path))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    processed = len(pages) * repeat
+    print(f"{name:<8} {processed / elapsed:8.1f} pages/s   {elapsed:7.2f}s   "
+          f"{chunks // repeat:6d} chunks   peak py heap {peak / 1024 / 1024:6.1f} MB")
+    return chunks // repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HTML extraction over a saved corpus of ITU pages.")
+    parser.add_argument("corpus", nargs="?", default=CORPUS_DIR)
+    parser.add_argument("--fetch", action="store_true", help="download the corpus first (uses ITU_LINKS)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", action="store_true", help="also time the old BeautifulSoup path")
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_corpus(args.corpus)
+
+    if not os.path.isdir(args.corpus):
+        print(f"No corpus at {args.corpus}/ -- run with --fetch first.")
+        sys.exit(1)
+
+    pages = []
+    for name in sorted(os.listdir(args.corpus)):
+        if name.endswith(".html"):
+            with open(os.path.join(args.corpus, name), "rb") as f:
+                pages.append((name, f.read()))
+    print(f"{len(pages)} pages, {sum(len(c) for _, c in pages) / 1024 / 1024:.1f} MB of HTML, x{args.repeat}")
+
+    lxml_chunks = run("lxml", extract_text, pages, args.repeat)
+    if args.compare:
+        try:
+            legacy_chunks = run("bs4", legacy_extract_text, pages, args.repeat)
+            if legacy_chunks != lxml_chunks:
+                print(f"   ! chunk counts differ: lxml {lxml_chunks} vs bs4 {legacy_chunks}")
+        except ImportError:
+            print("beautifulsoup4 is not installed; skipping --compare.")
+    print(f"Peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import math
+import heapq
+import logging
+import sqlite3
+import threading
+from collections import Counter, defaultdict, namedtuple
+
+logger = logging.getLogger("TheWatcher")
+
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "bm25_index.sqlite3")
+K1 = 1.5
+B = 0.75
+RRF_K = 60
+
+# Keeps amounts like "45,000" and codes like "cs-101" as single terms
+TOKEN = re.compile(r"[a-z0-9]+(?:[.,\-][a-z0-9]+)*")
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "of", "to", "in", "on", "for", "and", "or", "at", "by",
+    "what", "when", "where", "who", "how", "which", "do", "does", "i", "my", "me", "it", "be", "with",
+    "source", "content",
+}
+
+# Same shape as qdrant's ScoredPoint so the answer path doesn't care where a hit came from
+ScoredChunk = namedtuple("ScoredChunk", ["id", "score", "payload"])
+
+
+def tokenize(text):
+    return [term for term in TOKEN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk texts, stored in SQLite and kept in step with Qdrant by ingestion."""
+
+    def __init__(self, path=BM25_INDEX_PATH):
+        self.lock = threading.Lock()
+        self.nonempty = False  # cached has_documents(); an index only empties on --rebuild, which refills it
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, text TEXT, url TEXT, source_type TEXT, length INTEGER);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT, doc_id TEXT, tf INTEGER);
+            CREATE INDEX IF NOT EXISTS postings_term ON postings (term);
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+        """)
+        self.db.commit()
+
+    def add_documents(self, docs):
+        """docs: iterable of (point_id, payload) -- same IDs and payloads as the Qdrant points."""
+        docs = [(str(point_id), payload) for point_id, payload in docs]
+        if not docs:
+            return
+        with self.lock:
+            self._delete([point_id for point_id, _ in docs])
+            for point_id, payload in docs:
+                counts = Counter(tokenize(payload["text"]))
+                self.db.execute(
+                    "INSERT INTO docs VALUES (?, ?, ?, ?, ?)",
+                    (point_id, payload["text"], payload.get("url"), payload.get("source_type"), sum(counts.values())),
+                )
+                self.db.executemany("INSERT INTO postings VALUES (?, ?, ?)", [(term, point_id, tf) for term, tf in counts.items()])
+            self.db.commit()
+
+    def remove_documents(self, point_ids):
+        with self.lock:
+            self._delete([str(point_id) for point_id in point_ids])
+            self.db.commit()
+
+    def _delete(self, point_ids):
+        for start in range(0, len(point_ids), 500):
+            batch = point_ids[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            self.db.execute(f"DELETE FROM postings WHERE doc_id IN ({marks})", batch)
+            self.db.execute(f"DELETE FROM docs WHERE id IN ({marks})", batch)
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def has_documents(self):
+        if not self.nonempty:
+            self.nonempty = len(self) > 0
+        return self.nonempty
+
+    def search(self, query, limit=12):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self.lock:
+            doc_count, total_length = self.db.execute("SELECT COUNT(*), SUM(length) FROM docs").fetchone()
+            if not doc_count:
+                return []
+            avg_length = total_length / doc_count
+
+            scores = defaultdict(float)
+            for term in terms:
+                rows = self.db.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for doc_id, tf, length in rows:
+                    scores[doc_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            hits = []
+            for doc_id, score in top:
+                text, url, source_type = self.db.execute("SELECT text, url, source_type FROM docs WHERE id = ?", (doc_id,)).fetchone()
+                hits.append(ScoredChunk(doc_id, score, {"text": text, "url": url, "source_type": source_type}))
+        return hits
+
+    def rebuild_from_qdrant(self, client, collection_name):
+        # One-off bootstrap for chunks that were ingested before the index existed
+        with self.lock:
+            self.db.executescript("DELETE FROM postings; DELETE FROM docs;")
+            self.db.commit()
+        offset = None
+        while True:
+            points, offset = client.scroll(collection_name=collection_name, limit=256, offset=offset, with_payload=True, with_vectors=False)
+            self.add_documents((point.id, point.payload) for point in points if point.payload and "text" in point.payload)
+            if offset is None:
+                return len(self)
+
+
+def reciprocal_rank_fusion(result_lists, limit=12, k=RRF_K):
+    """Merge ranked hit lists by sum(1 / (k + rank)); the first list's payload wins on ties."""
+    fused = {}
+    payloads = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits):
+            key = str(hit.id)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+            payloads.setdefault(key, hit.payload)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [ScoredChunk(key, score, payloads[key]) for key, score in ranked]
+
+
+def open_lexical_index():
+    try:
+        return LexicalIndex()
+    except sqlite3.Error as e:
+        logger.error(f"BM25 index disabled: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    # python bm25_index.py --rebuild   -> re-index everything currently in Qdrant
+    if "--rebuild" in sys.argv:
+        from dotenv import load_dotenv
+        from knowledge_base import COLLECTION_NAME
+        from vector_store import open_vector_store
+
+        load_dotenv()
+        client = open_vector_store()
+        print(f"Indexed {LexicalIndex().rebuild_from_qdrant(client, COLLECTION_NAME)} chunks.")
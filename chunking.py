@@ -0,0 +1,13 @@
+CHUNK_SIZE = 12   # lines per chunk
+OVERLAP = 4       # lines shared with the previous chunk
+
+
+def chunk_text(text, source, chunk_size=CHUNK_SIZE, overlap=OVERLAP):
+    """Sliding line-window chunker shared by the web and handbook ingestion."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    chunks = []
+    for i in range(0, len(lines), chunk_size - overlap):
+        window = lines[i : i + chunk_size]
+        if len(window) < 3: continue
+        chunks.append(f"Source: {source}\nContent: " + "\n".join(window))
+    return chunks
@@ -0,0 +1,139 @@
+import os
+import math
+from collections import Counter, namedtuple
+
+from bm25_index import tokenize
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1800"))  # prompt tokens spent on archive passages
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))     # 1 = pure relevance, 0 = pure diversity
+CONTEXT_DUP_SIMILARITY = float(os.getenv("CONTEXT_DUP_SIMILARITY", "0.85"))  # term cosine above which a passage is a repeat
+MIN_OVERLAP_LINES = 2    # shared lines needed to stitch two windows (one shared "Apply Now" line is not an overlap)
+MIN_PARTIAL_TOKENS = 60  # don't bother squeezing in a truncated passage smaller than this
+CHARS_PER_TOKEN = 4      # Llama-3 averages ~4 characters of English per token; no tokenizer needed
+
+# focus: first line of the best-ranked window in `lines`, kept when a passage has to be cut down
+Passage = namedtuple("Passage", ["source", "lines", "url", "ids", "relevance", "focus"])
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _split_chunk(hit):
+    # chunk_text() records look like "Source: <url>\nContent: <line>\n<line>..."
+    text = hit.payload["text"]
+    header, _, body = text.partition("\nContent: ")
+    if not body or not header.startswith("Source: "):
+        return hit.payload.get("url", ""), [line for line in text.splitlines() if line.strip()]
+    return header[len("Source: "):], body.splitlines()
+
+
+def _stitch(first, second):
+    """
+    (lines, offset of second within them) if second continues first (sliding-window overlap) or is
+    contained in it, else None.
+    """
+    for i in range(len(first) - len(second) + 1):
+        if first[i:i + len(second)] == second:
+            return first, i
+    for size in range(min(len(first), len(second)) - 1, MIN_OVERLAP_LINES - 1, -1):
+        if first[-size:] == second[:size]:
+            return first + second[size:], len(first) - size
+    return None
+
+
+def merge_windows(hits):
+    """Hits (ranked) -> passages, with overlapping windows from the same page stitched into one."""
+    passages = []
+    for rank, hit in enumerate(hits):
+        source, lines = _split_chunk(hit)
+        passage = Passage(source, lines, hit.payload.get("url", source), [str(hit.id)], 1.0 / (rank + 1), 0)
+        merged = True
+        while merged:
+            merged = False
+            for i, other in enumerate(passages):
+                if other.url != passage.url:
+                    continue
+                for first, second in ((other, passage), (passage, other)):
+                    stitched = _stitch(first.lines, second.lines)
+                    if stitched is None:
+                        continue
+                    lines, offset = stitched
+                    best_first = first.relevance >= second.relevance
+                    focus = first.focus if best_first else offset + second.focus
+                    passage = Passage(other.source, lines, other.url, other.ids + passage.ids, max(first.relevance, second.relevance), focus)
+                    del passages[i]
+                    merged = True
+                    break
+                if merged:
+                    break
+        passages.append(passage)
+    return passages
+
+
+def _vector(passage):
+    return Counter(tokenize(" ".join(passage.lines)))
+
+
+def _cosine(a, b):
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def mmr_order(passages, mmr_lambda=CONTEXT_MMR_LAMBDA, dup_similarity=CONTEXT_DUP_SIMILARITY):
+    """
+    Maximal marginal relevance over term vectors: each pick trades its retrieval rank against its
+    similarity to what is already picked. Passages nearly identical to a pick are dropped outright.
+    """
+    vectors = [_vector(passage) for passage in passages]
+    remaining = list(range(len(passages)))
+    picked = []
+    while remaining:
+        best, best_score = None, -math.inf
+        for i in remaining:
+            redundancy = max((_cosine(vectors[i], vectors[j]) for j in picked), default=0.0)
+            score = mmr_lambda * passages[i].relevance - (1 - mmr_lambda) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        remaining.remove(best)
+        if picked and max(_cosine(vectors[best], vectors[j]) for j in picked) >= dup_similarity:
+            continue
+        picked.append(best)
+    return [passages[i] for i in picked]
+
+
+def render(passage, lines=None):
+    return f"Source: {passage.source}\nContent: " + "\n".join(passage.lines if lines is None else lines)
+
+
+def build_context(hits, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Ranked hits -> (context text, passages used). Overlapping windows are merged, repeats dropped,
+    the rest ordered by MMR and packed until token_budget; the last passage may be cut by lines.
+    """
+    packed, texts, used = [], [], 0
+    for passage in mmr_order(merge_windows(hits)):
+        text = render(passage)
+        cost = estimate_tokens(text) + 1
+        if used + cost <= token_budget:
+            packed.append(passage)
+            texts.append(text)
+            used += cost
+            continue
+        room = token_budget - used
+        if room >= MIN_PARTIAL_TOKENS:
+            # Trim from whichever end is farther from the best-ranked window
+            start, end = 0, len(passage.lines)
+            while end > start and estimate_tokens(render(passage, passage.lines[start:end])) + 1 > room:
+                if end - 1 - passage.focus >= passage.focus - start:
+                    end -= 1
+                else:
+                    start += 1
+            if end > start:
+                lines = passage.lines[start:end]
+                packed.append(passage._replace(lines=lines, focus=max(0, passage.focus - start)))
+                texts.append(render(passage, lines))
+                used += estimate_tokens(texts[-1]) + 1
+        break
+    return "\n\n".join(texts), packed
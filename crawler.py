@@ -0,0 +1,398 @@
+import os
+import asyncio
+import logging
+import random
+import time
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlsplit, urlunsplit, urljoin, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+import httpx
+
+from ingest_state import content_hash
+from extractor import USER_AGENT
+from embedding import EMBED_BATCH_SIZE
+from metrics import Trace, use_trace, span, INGESTED_PAGES
+
+logger = logging.getLogger("TheWatcher")
+
+MAX_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "16"))   # pages in flight across all hosts
+PER_HOST_RATE = float(os.getenv("CRAWL_PER_HOST_RATE", "4"))  # requests/sec per host
+PER_HOST_BURST = int(os.getenv("CRAWL_PER_HOST_BURST", "4"))
+PARSE_WORKERS = int(os.getenv("CRAWL_PARSE_WORKERS", "4"))
+MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "3"))
+CHECKPOINT_EVERY = int(os.getenv("CRAWL_CHECKPOINT_EVERY", "25"))  # finished pages between durable checkpoints
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+GONE_STATUSES = {404, 410}  # the page was removed, as opposed to failing this time
+URL_LISTS = ("urls", "gone_urls")  # per-URL stats, left out of progress reports and job results
+
+
+class TokenBucket:
+    """Politeness limiter: refills `rate` tokens/sec up to `capacity`, one token per request."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _retry_delay(attempt, response=None):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+
+
+async def fetch(client, url, buckets, headers=None, retries=MAX_RETRIES):
+    """GET with per-host token bucket and exponential backoff. Returns the response or None."""
+    host = urlparse(url).netloc
+    bucket = buckets.setdefault(host, TokenBucket(PER_HOST_RATE, PER_HOST_BURST))
+
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            if attempt == retries:
+                logger.error(f"Fetch error on {url}: {e}")
+                return None
+            await asyncio.sleep(_retry_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            await asyncio.sleep(_retry_delay(attempt, response))
+            continue
+        return response
+    return None
+
+
+NOISE_PARAMS = {"replytocom", "fbclid", "gclid", "share"}
+
+
+def normalize_url(url):
+    """Canonical form used for dedup: lowercase host, no fragment, no tracking params, no trailing slash."""
+    parts = urlsplit(url.strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key.lower() not in NOISE_PARAMS and not key.lower().startswith("utm_")]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), ""))
+
+
+async def load_robots(client, buckets, host_url):
+    robots = RobotFileParser()
+    response = await fetch(client, urljoin(host_url, "/robots.txt"), buckets, retries=1)
+    robots.parse(response.text.splitlines() if response is not None and response.status_code == 200 else [])
+    return robots
+
+
+async def sitemap_urls(client, buckets, sitemap_url, nested=2):
+    """<loc> entries of a sitemap, following sitemap indexes `nested` levels deep."""
+    response = await fetch(client, sitemap_url, buckets, retries=1)
+    if response is None or response.status_code != 200:
+        return []
+    try:
+        root = ElementTree.fromstring(response.content)
+    except ElementTree.ParseError:
+        return []
+    locs = [element.text.strip() for element in root.iter() if element.tag.endswith("loc") and element.text]
+    if not root.tag.endswith("sitemapindex"):
+        return locs
+    if nested <= 0:
+        return []
+    urls = []
+    for child_sitemaps in await asyncio.gather(*(sitemap_urls(client, buckets, loc, nested - 1) for loc in locs)):
+        urls.extend(child_sitemaps)
+    return urls
+
+
+async def crawl(seeds, parse, handle, concurrency=MAX_CONCURRENCY, state=None, batch_size=EMBED_BATCH_SIZE,
+                links=None, priority=None, max_pages=None, max_depth=MAX_DEPTH, use_sitemaps=True, finalize=None,
+                checkpoint=None, checkpoint_every=CHECKPOINT_EVERY, resume=(), stop=None):
+    """
+    Fetch -> parse -> handle pipeline over a priority frontier.
+    - parse(url, content) runs in a thread pool and returns chunks (or None to skip the page).
+    - handle(pages) is the sync embed/upsert step for a list of (url, chunks); it runs on a single
+      consumer so the embedding model is never called concurrently, but it overlaps with fetching
+      and parsing. Pages already waiting are grouped until they reach ~batch_size chunks.
+    - state (a PageState) enables conditional GETs; pages answering 304 or whose extracted
+      text hashes the same as last run never reach handle().
+    - links(url, content) -> urls makes the crawl recursive up to max_depth. Every URL is normalized
+      and deduplicated; priority(url, depth) orders the frontier (lower first), so max_pages is spent
+      on the most useful pages. robots.txt is honoured and sitemaps seed the frontier. Each page's
+      outlinks are kept in state, so a 304 still expands the frontier on the next run.
+    - Pages answering 404/410 count as "gone" (listed in stats["gone_urls"] and forgotten in state), not
+      as "failed"; stats["seeds_failed"] counts seeds that did not come back with a page.
+    - finalize() runs after the last handle() (e.g. a write-behind barrier) and returns URLs whose
+      writes failed after all; they are forgotten in state so the next run retries them. A stored
+      page's new hash only enters state once a barrier has confirmed its writes, and state is only
+      saved after a barrier, never from a failed crawl.
+    - checkpoint(entries, progress) is called every checkpoint_every finished pages and once at the end,
+      with the (url, outcome) pairs finished since the last call. finalize() and state.save() run
+      first, so a checkpointed "stored" page is durable. URLs in resume (done by an interrupted run)
+      are not fetched again; their saved outlinks still expand the frontier.
+    - stop (a threading.Event) ends the crawl early: once set, no new page is taken from the frontier;
+      pages already in flight finish and go through the final barrier as usual.
+    Every page logs its own stage breakdown (fetch, parse, plus its chunk share of the batched
+    embed/write stages); stats["stage_seconds"] holds the run totals.
+    """
+    stats = {"pages": 0, "fetched": 0, "unchanged": 0, "failed": 0, "gone": 0, "stored": 0, "resumed": 0, "seeds_failed": 0,
+             "urls": [], "gone_urls": [], "stage_seconds": {}}
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+    buckets = {}
+    slots = asyncio.Semaphore(concurrency)
+    queue = asyncio.Queue(maxsize=concurrency * 2)  # backpressure if embedding falls behind
+    parse_pool = ThreadPoolExecutor(max_workers=PARSE_WORKERS)
+    max_pages = max_pages if max_pages is not None else len(seeds)
+    priority = priority or (lambda url, depth: depth)
+
+    frontier = []  # heap of (priority, tiebreak, url, depth)
+    seen = set()
+    counter = itertools.count()
+    robots = {}
+    in_flight = 0
+    frontier_changed = asyncio.Event()
+    resume = set(resume)
+    finished = []       # (url, outcome) since the last checkpoint
+    lost_writes = set()  # pages handled as stored whose writes a barrier reported lost
+    unconfirmed = {}     # url -> (hash, validators) of stored pages whose writes no barrier has confirmed yet
+    checkpoint_lock = asyncio.Lock()
+
+    def enqueue(url, depth):
+        url = normalize_url(url)
+        host_robots = robots.get(urlsplit(url).netloc)
+        if url in seen or depth > max_depth or (host_robots and not host_robots.can_fetch(USER_AGENT, url)):
+            return
+        seen.add(url)
+        heapq.heappush(frontier, (priority(url, depth), next(counter), url, depth))
+        frontier_changed.set()
+
+    def parse_page(url, content):
+        chunks = parse(url, content)
+        return chunks, (sorted({normalize_url(link) for link in links(url, content)}) if links else [])
+
+    def expand(page_links, depth):
+        for link in page_links:
+            enqueue(link, depth + 1)
+
+    def finish(page, outcome, **fields):
+        INGESTED_PAGES.inc(outcome=outcome)
+        for stage, seconds in page.stages.items():
+            stats["stage_seconds"][stage] = round(stats["stage_seconds"].get(stage, 0.0) + seconds, 4)
+        page.log(outcome=outcome, **fields)
+        if outcome != "resumed":
+            finished.append((page.fields["url"], outcome))
+
+    async def barrier(name):
+        # Pages stored before this point have handed their writes to the sink, so the barrier covers them
+        confirming = dict(unconfirmed)
+        failed_writes = []
+        if finalize:
+            trace = Trace(name)
+            with span("barrier", trace):
+                failed_writes = await asyncio.to_thread(finalize)
+            stats["stage_seconds"]["barrier"] = round(stats["stage_seconds"].get("barrier", 0.0) + trace.stages["barrier"], 4)
+            trace.log(failed=len(failed_writes))
+        for url in failed_writes:
+            lost_writes.add(url)
+            stats["stored"] -= 1
+            stats["failed"] += 1
+            if state:
+                state.forget(url)
+        for url, (digest, validators) in confirming.items():
+            del unconfirmed[url]
+            # A checkpoint barrier can flush (and lose) a batch whose handle() is still running, before the
+            # consumer lists it as unconfirmed; a lost write must never be confirmed by a later barrier
+            if state and url not in lost_writes:
+                state.update(url, hash=digest, **validators)
+
+    async def save_checkpoint(name="ingest_checkpoint"):
+        # State is only ever saved right after a barrier, so a saved hash always means the page's writes landed
+        async with checkpoint_lock:
+            entries, finished[:] = finished[:], []
+            await barrier(name)
+            if state:
+                try:
+                    state.save()
+                except OSError as e:
+                    logger.error(f"Could not save ingest state: {e}")
+            if not checkpoint:
+                return
+            progress = summary(stats)
+            await asyncio.to_thread(checkpoint, [(url, "failed" if url in lost_writes else outcome) for url, outcome in entries], progress)
+
+    async def process(url, depth):
+        page = Trace("ingest_page", url=url, depth=depth)
+        known_links = state.get(url).get("links") if state else None
+        if url in resume and (known_links is not None or not links):
+            stats["resumed"] += 1
+            expand(known_links or [], depth)
+            finish(page, "resumed")
+            return
+        # A 304 can only expand the frontier if we kept the page's links last time
+        revalidate = state and (not links or "links" in state.get(url))
+        headers = state.conditional_headers(url) if revalidate else None
+        async with slots:
+            with span("fetch", page):
+                response = await fetch(client, url, buckets, headers)
+        if response is not None and response.status_code == 304:
+            stats["unchanged"] += 1
+            expand(state.get(url).get("links", []), depth)
+            finish(page, "not_modified")
+            return
+        if response is None or response.status_code != 200:
+            stats["seeds_failed"] += depth == 0
+            if response is not None and response.status_code in GONE_STATUSES:
+                stats["gone"] += 1
+                stats["gone_urls"].append(url)
+                if state:
+                    state.forget(url)  # so earlier runs' links stop bringing it back into the frontier
+                finish(page, "gone", status=response.status_code)
+                return
+            stats["failed"] += 1
+            finish(page, "failed", status=response.status_code if response is not None else None)
+            return
+        stats["fetched"] += 1
+
+        with span("parse", page):
+            chunks, page_links = await loop.run_in_executor(parse_pool, parse_page, url, response.content)
+        expand(page_links, depth)
+        if chunks is None:
+            stats["failed"] += 1
+            finish(page, "failed")
+            return
+
+        validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        if state and links:
+            state.update(url, links=page_links)
+        digest = content_hash(chunks)
+        if state and state.get(url).get("hash") == digest:
+            state.update(url, **validators)
+            stats["unchanged"] += 1
+            finish(page, "unchanged", chunks=len(chunks))
+            return
+        await queue.put((url, chunks, digest, validators, page))
+
+    async def worker():
+        nonlocal in_flight
+        while True:
+            while not frontier:
+                if in_flight == 0:
+                    return
+                frontier_changed.clear()
+                await frontier_changed.wait()
+            if stats["pages"] >= max_pages or (stop and stop.is_set()):
+                return
+            _, _, url, depth = heapq.heappop(frontier)
+            stats["pages"] += 1
+            stats["urls"].append(url)
+            in_flight += 1
+            try:
+                await process(url, depth)
+            except Exception as e:
+                stats["failed"] += 1
+                stats["seeds_failed"] += depth == 0
+                INGESTED_PAGES.inc(outcome="failed")
+                logger.error(f"Crawl error on {url}: {e}")
+            finally:
+                in_flight -= 1
+                frontier_changed.set()
+            if checkpoint and len(finished) >= checkpoint_every and not checkpoint_lock.locked():
+                await save_checkpoint()
+
+    async def consumer():
+        done = False
+        while not done:
+            batch = [await queue.get()]
+            # Drain whatever is already parsed, up to one embedding batch worth of chunks
+            while batch[-1] is not None and sum(len(item[1]) for item in batch) < batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            if not batch:
+                continue
+
+            batch_trace = Trace("ingest_batch", pages=len(batch))
+            try:
+                with use_trace(batch_trace):  # handle()'s spans (embed, upsert, ...) land on the batch
+                    await asyncio.to_thread(handle, [(url, chunks) for url, chunks, _, _, _ in batch])
+                stats["stored"] += len(batch)
+                outcome = "stored"
+            except Exception as e:
+                # Don't record the new hashes, so these pages are retried next run
+                logger.error(f"DB Error on {', '.join(item[0] for item in batch)}: {e}")
+                outcome = "failed"
+            # Batched stages are shared out by chunk count, so per-page breakdowns add up to the run
+            total_chunks = sum(len(item[1]) for item in batch) or 1
+            for url, chunks, digest, validators, page in batch:
+                for stage, seconds in batch_trace.stages.items():
+                    page.add(stage, seconds * len(chunks) / total_chunks)
+                finish(page, outcome, chunks=len(chunks), batch_pages=len(batch), batch_id=batch_trace.trace_id)
+                if state and outcome == "stored" and url not in lost_writes:
+                    unconfirmed[url] = (digest, validators)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(headers={"User-Agent": USER_AGENT}, timeout=30, limits=limits, follow_redirects=True) as client:
+            hosts = sorted({f"{urlsplit(seed).scheme}://{urlsplit(seed).netloc}" for seed in seeds})
+            if links:
+                for host_url, host_robots in zip(hosts, await asyncio.gather(*(load_robots(client, buckets, h) for h in hosts))):
+                    robots[urlsplit(host_url).netloc] = host_robots
+
+            for seed in seeds:
+                enqueue(seed, 0)
+            if links and state:
+                # Pages found on earlier runs compete for the budget right away instead of waiting to be rediscovered
+                for known_url, entry in list(state.pages.items()):
+                    if "links" in entry:
+                        enqueue(known_url, 1)
+            if links and use_sitemaps:
+                sitemaps = set()
+                for host_url in hosts:
+                    sitemaps.update(robots[urlsplit(host_url).netloc].site_maps() or [urljoin(host_url, "/sitemap.xml")])
+                for found in await asyncio.gather(*(sitemap_urls(client, buckets, sitemap) for sitemap in sitemaps)):
+                    for url in found:
+                        if urlsplit(url).netloc.lower() in robots:
+                            enqueue(url, 1)
+
+            sink = asyncio.create_task(consumer())
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            await queue.put(None)
+            await sink
+            await save_checkpoint("ingest_barrier")
+    finally:
+        # No state.save() here: after an error, hashes of pages still in the write-behind buffer must not persist
+        parse_pool.shutdown(wait=False)
+
+    stats["seconds"] = round(time.monotonic() - started, 2)
+    stats["stopped"] = bool(stop and stop.is_set())
+    return stats
+
+
+def summary(stats):
+    """The crawl stats without the per-URL lists."""
+    return {key: value for key, value in stats.items() if key not in URL_LISTS}
+
+
+def run_ingestion(seeds, parse, handle, concurrency=MAX_CONCURRENCY, state=None, batch_size=EMBED_BATCH_SIZE, **crawl_options):
+    """Sync entry point for scripts and the ingestion worker. See crawl() for crawl_options."""
+    return asyncio.run(crawl(seeds, parse, handle, concurrency, state, batch_size, **crawl_options))
@@ -0,0 +1,168 @@
+import os
+import sys
+import asyncio
+import hashlib
+import math
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger("TheWatcher")
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Pre-baked ONNX model (python embedding.py --download at build time); absent -> fastembed's temp dir, i.e. a download per cold start
+MODEL_CACHE_DIR = os.getenv("EMBED_MODEL_CACHE_DIR", "model_cache")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embedding_cache.sqlite3")
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "64"))
+# fastembed data-parallel workers, off unless set: each call starts a process pool that loads the model again,
+# and ONNX already uses all cores in one call, so only turn it on where a measurement shows it pays off
+EMBED_PARALLEL = int(os.getenv("EMBED_PARALLEL", "0"))
+PARALLEL_MIN_TEXTS = int(os.getenv("EMBED_PARALLEL_MIN_TEXTS", str(EMBED_BATCH_SIZE)))  # smaller calls never spawn workers
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))  # threads serving async callers; ONNX already uses all cores per call
+
+
+class EmbeddingCache:
+    """SQLite-backed text-hash -> float32 vector cache with least-recently-used eviction by size."""
+
+    def __init__(self, path=EMBED_CACHE_PATH, max_mb=EMBED_CACHE_MAX_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, last_used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.db.commit()
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self.db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+            now = time.time()
+            self.db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self.db.commit()
+        return found
+
+    def put_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._evict(len(rows[0][1]))
+            self.db.commit()
+
+    def _evict(self, row_bytes):
+        max_rows = max(1, self.max_bytes // row_bytes)
+        (count,) = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > max_rows:
+            self.db.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - max_rows,),
+            )
+
+
+class Embedder:
+    """
+    Shared embedding layer for the bot, the crawler and the inspection scripts.
+    Texts are looked up in the cache first; misses are embedded in batches of `batch_size`.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, batch_size=EMBED_BATCH_SIZE, cache=None, model_cache_dir=MODEL_CACHE_DIR):
+        self.model_name = model_name
+        self.model_cache_dir = model_cache_dir
+        self.batch_size = batch_size
+        self.cache = cache
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                started = time.perf_counter()
+                from fastembed import TextEmbedding
+                cache_dir = self.model_cache_dir if self.model_cache_dir and os.path.isdir(self.model_cache_dir) else None
+                self._model = TextEmbedding(model_name=self.model_name, cache_dir=cache_dir)
+                logger.info(f"Loaded {self.model_name} from {cache_dir or 'download'} in {time.perf_counter() - started:.2f}s")
+            return self._model
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def warm_up(self):
+        """Loads the model and runs one inference (ONNX's first run is the slow one); returns seconds taken."""
+        started = time.perf_counter()
+        list(self.model.embed(["warm up"]))
+        return time.perf_counter() - started
+
+    def _batching(self, count, allow_parallel=True):
+        """(batch_size, parallel) for fastembed. fastembed hands whole batches to its workers, so in
+        parallel mode the call is cut into one batch per worker instead of one batch_size batch."""
+        workers = EMBED_PARALLEL if allow_parallel and count >= PARALLEL_MIN_TEXTS else 1
+        if workers <= 1:
+            return self.batch_size, None
+        return min(self.batch_size, math.ceil(count / workers)), workers
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, texts, allow_parallel=True):
+        """list[str] -> list[list[float]], in input order."""
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many(list(set(keys))) if self.cache else {}
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        if missing:
+            miss_keys = list(missing)
+            miss_texts = [missing[key] for key in miss_keys]
+            batch_size, parallel = self._batching(len(miss_texts), allow_parallel)
+            vectors = self.model.embed(miss_texts, batch_size=batch_size, parallel=parallel)
+            fresh = list(zip(miss_keys, vectors))
+            cached.update(fresh)
+            if self.cache:
+                self.cache.put_many(fresh)
+            logger.info(f"Embedded {len(miss_texts)} texts ({len(texts) - len(miss_texts)} from cache)")
+
+        return [np.asarray(cached[key], dtype=np.float32).tolist() for key in keys]
+
+    def embed_query(self, text):
+        # Interaction path: never pays for a worker pool
+        return self.embed([text], allow_parallel=False)[0]
+
+    async def embed_query_async(self, text):
+        # CPU-bound ONNX inference stays off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_query, text)
+
+
+@lru_cache(maxsize=None)
+def get_embedder():
+    try:
+        cache = EmbeddingCache()
+    except sqlite3.Error as e:
+        logger.error(f"Embedding cache disabled: {e}")
+        cache = None
+    return Embedder(cache=cache)
+
+
+if __name__ == "__main__":
+    # python embedding.py --download   -> bake the model into EMBED_MODEL_CACHE_DIR for the deploy bundle
+    if "--download" in sys.argv:
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        print(f"Model ready in {MODEL_CACHE_DIR}/ ({Embedder(cache=None).warm_up():.1f}s)")
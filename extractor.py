@@ -0,0 +1,122 @@
+import logging
+import requests
+import lxml.html
+from lxml import etree
+from urllib.parse import urljoin, urlparse
+from chunking import chunk_text
+
+logger = logging.getLogger("TheWatcher")
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+SKIP_LINK_PARTS = [".pdf", ".jpg", "#", "wp-content", "login", "feed"]
+KEEP_LINK_KEYWORDS = ["academics", "faculty", "program", "department", "admissions", "fee", "examinations", "research", "administration"]
+PRIORITY_KEYWORDS = {"fee": 2, "admissions": 2, "program": 1.5, "examinations": 1.5, "academics": 1, "faculty": 1, "department": 1, "administration": 1, "research": 0.5}
+
+NOISE_CLASSES = ["fusion-footer", "fusion-header-wrapper", "fusion-sliding-bar", "fusion-page-title-bar", "fusion-sharing-box"]
+NOISE_IDS = ["sliders-container", "side-header"]
+NOISE_TAGS = ["script", "style", "iframe", "form", "nav"]
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Every noise selector in one compiled XPath, so the tree is walked once instead of once per selector
+NOISE_XPATH = etree.XPath("//*[" + " or ".join(
+    [f"self::{tag}" for tag in NOISE_TAGS]
+    + [f"@id='{element_id}'" for element_id in NOISE_IDS]
+    + [_has_class(name) for name in NOISE_CLASSES]
+) + "]")
+PRICING_XPATH = etree.XPath(f"//*[{_has_class('fusion-pricing-table')}]")
+PRICING_HEADINGS = etree.XPath(f".//*[{_has_class('panel-heading')}]")
+PRICING_PRICES = etree.XPath(f".//*[{_has_class('panel-body')}]")
+PRICING_FEATURES = etree.XPath(f".//*[{_has_class('list-group-item')}]")
+TABLE_ROWS = etree.XPath(".//tr")
+ROW_CELLS = etree.XPath("./td | ./th")
+MAIN_XPATH = etree.XPath("//*[@id='main']")
+
+
+def _stripped_text(element):
+    # Same as BeautifulSoup's get_text(strip=True)
+    return "".join(part.strip() for part in element.itertext())
+
+
+def _replace_with_text(element, text):
+    block = etree.Element("div")
+    block.text = text
+    block.tail = element.tail
+    element.getparent().replace(element, block)
+
+
+def extract_text(content):
+    """HTML bytes -> the page's readable text, one text node per line."""
+    root = lxml.html.document_fromstring(content)
+
+    #Avada Pricing Tables
+    for pricing in PRICING_XPATH(root):
+        headers = [_stripped_text(h) for h in PRICING_HEADINGS(pricing)]
+        prices = [_stripped_text(p) for p in PRICING_PRICES(pricing)]
+        features = [_stripped_text(f) for f in PRICING_FEATURES(pricing)]
+        _replace_with_text(pricing, f"\n=== FEE/PRICING DATA ===\nPlans: {', '.join(headers)}\nPrices: {', '.join(prices)}\nDetails: {', '.join(features)}\n========================\n")
+
+    #Standard Tables
+    for table in list(root.iter("table")):
+        rows = [" | ".join(_stripped_text(cell) for cell in ROW_CELLS(row)) for row in TABLE_ROWS(table)]
+        _replace_with_text(table, "\n--- TABLE DATA ---\n" + "\n".join(rows) + ("\n" if rows else "") + "------------------\n")
+
+    for element in NOISE_XPATH(root):
+        if element.getparent() is not None:
+            element.drop_tree()
+
+    main_content = MAIN_XPATH(root)
+    return "\n".join((main_content[0] if main_content else root).itertext())
+
+
+def get_precision_content(url, content=None):
+    try:
+        if content is None:
+            response = requests.get(url, headers={'User-Agent': USER_AGENT}, timeout=30)
+            if response.status_code != 200:
+                logger.warning(f"Status Code {response.status_code} on {url}")
+                return None
+            content = response.content
+        return chunk_text(extract_text(content), url)
+    except Exception as e:
+        logger.error(f"Scrape error on {url}: {e}")
+        return None
+
+
+def extract_links(base_url, content):
+    """Same-site page links (no files, anchors, logins or feeds)."""
+    found_links = set()
+    try:
+        root = lxml.html.document_fromstring(content)
+    except Exception as e:
+        # e.g. an empty 200 body; the page's chunks (if any) still count
+        logger.error(f"Link extraction error on {base_url}: {e}")
+        return found_links
+    base_domain = urlparse(base_url).netloc
+    for href in root.xpath("//a/@href"):
+        full_url = urljoin(base_url, href)
+        if urlparse(full_url).netloc != base_domain: continue
+        if any(x in full_url for x in SKIP_LINK_PARTS): continue
+        found_links.add(full_url)
+    return found_links
+
+
+def link_priority(url, depth):
+    # Lower is crawled first: shallow pages about fees/admissions/programs beat deep or off-topic ones
+    path = urlparse(url).path.lower()
+    relevance = sum(weight for keyword, weight in PRIORITY_KEYWORDS.items() if keyword in path)
+    return depth - min(relevance, 3) + 0.1 * path.count("/")
+
+
+def discover_internal_links(seed_url):
+    # One hop from the seed, keyword-filtered; the ingestion crawl itself uses extract_links + link_priority
+    try:
+        response = requests.get(seed_url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+        return [url for url in extract_links(seed_url, response.content) if any(k in url for k in KEEP_LINK_KEYWORDS)]
+    except Exception as e:
+        logger.error(f"Error crawling {seed_url}: {e}")
+        return []
@@ -0,0 +1,156 @@
+import os
+import re
+import sys
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+from qdrant_client.models import VectorParams, Distance
+from dotenv import load_dotenv
+from chunking import chunk_text
+from ingest_state import PageState, content_hash
+from knowledge_base import sync_pages, QdrantSink, COLLECTION_NAME, QDRANT_PREFER_GRPC
+from embedding import get_embedder, EMBED_BATCH_SIZE
+from answer_cache import open_answer_cache
+from bm25_index import open_lexical_index
+from metrics import Trace, use_trace
+from vector_store import open_vector_store
+
+load_dotenv()
+
+logger = logging.getLogger("TheWatcher")
+
+HANDBOOK_PATH = os.getenv("HANDBOOK_PATH", "handbook.pdf")
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+PAGES_PER_TASK = 4
+
+GLYPH_ID = re.compile(r"/gid\d+")
+
+_reader = None
+
+
+def page_url(path, page_no):
+    return f"{os.path.basename(path)}#page={page_no}"
+
+
+def _open_reader(path):
+    # Process pool initializer: each worker parses the PDF's xref once, not once per page
+    global _reader
+    _reader = PdfReader(path)
+
+
+def _extract_pages(page_numbers):
+    results = []
+    for page_no in page_numbers:
+        text = _reader.pages[page_no - 1].extract_text() or ""
+        # Pages set in fonts without a unicode map come out as /gidNNNNN runs; they need OCR, not chunking
+        if len(GLYPH_ID.findall(text)) * 10 > len(text.split()):
+            logger.warning(f"Handbook page {page_no} has no extractable text layer, skipping.")
+            text = ""
+        # The handbook's font maps the 'ti' ligature to U+FFFD (regula_ons, examina_ons)
+        text = text.replace("\ufffd", "ti")
+        results.append((page_no, chunk_text(text, f"Student Handbook, page {page_no}")))
+    return results
+
+
+def stream_handbook_pages(path, workers=PDF_WORKERS):
+    """Yields (page_no, chunks) in page order while later pages are still being parsed."""
+    page_count = len(PdfReader(path).pages)
+    tasks = [range(start, min(start + PAGES_PER_TASK, page_count + 1)) for start in range(1, page_count + 1, PAGES_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_reader, initargs=(path,)) as pool:
+        for results in pool.map(_extract_pages, tasks):
+            yield from results
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingest_handbook(client, embedder, path=HANDBOOK_PATH, state=None, answer_cache=None, lexical_index=None):
+    """
+    1. Skips everything if the PDF file itself is byte-identical to the last run.
+    2. Otherwise re-parses pages in a process pool and only re-syncs pages whose chunk hash changed.
+    3. Pages that disappeared from a revised handbook get their vectors removed.
+    Writes go through a QdrantSink and are confirmed by its barrier before state is saved.
+    """
+    state = state or PageState(source="handbook")
+    stats = {"pages": 0, "unchanged": 0, "synced": 0, "removed": 0, "added_chunks": 0, "removed_chunks": 0}
+
+    pdf_key = os.path.basename(path)
+    pdf_hash = file_hash(path)
+    if state.get(pdf_key).get("hash") == pdf_hash:
+        logger.info("Handbook unchanged since last run.")
+        return stats
+
+    pending = []
+    sink = QdrantSink(client)
+
+    def flush():
+        if not pending:
+            return
+        with use_trace(Trace("handbook_batch", pages=len(pending))) as batch:
+            added, removed = sync_pages(client, embedder.embed, [(url, chunks, extra) for url, chunks, extra, _ in pending], source_type="handbook", lexical_index=lexical_index, sink=sink)
+        batch.log(added=added, removed=removed)
+        stats["added_chunks"] += added
+        stats["removed_chunks"] += removed
+        for url, _, _, digest in pending:
+            state.update(url, hash=digest)
+        if answer_cache:
+            answer_cache.invalidate_urls([url for url, *_ in pending])
+        pending.clear()
+
+    seen = set()
+    for page_no, chunks in stream_handbook_pages(path):
+        stats["pages"] += 1
+        url = page_url(path, page_no)
+        seen.add(url)
+        digest = content_hash(chunks)
+        if state.get(url).get("hash") == digest:
+            stats["unchanged"] += 1
+            continue
+        pending.append((url, chunks, {"page": page_no}, digest))
+        stats["synced"] += 1
+        if sum(len(item[1]) for item in pending) >= EMBED_BATCH_SIZE:
+            flush()
+    flush()
+
+    prefix = page_url(path, "")
+    for url in [url for url in state.pages if url.startswith(prefix) and url not in seen]:
+        pending.append((url, [], {}, None))
+        stats["removed"] += 1
+    flush()
+    for url in [url for url in state.pages if url.startswith(prefix) and url not in seen]:
+        state.forget(url)
+
+    failed = sink.barrier()
+    for url in failed:
+        state.forget(url)  # retried next run
+    if not failed:
+        state.update(pdf_key, hash=pdf_hash)
+    state.save()
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    path = sys.argv[1] if len(sys.argv) > 1 else HANDBOOK_PATH
+    qdrant_client = open_vector_store(prefer_grpc=QDRANT_PREFER_GRPC)
+
+    if not qdrant_client.collection_exists(collection_name=COLLECTION_NAME):
+        qdrant_client.create_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+        )
+    try:
+        qdrant_client.create_payload_index(collection_name=COLLECTION_NAME, field_name="url", field_schema="keyword")
+        qdrant_client.create_payload_index(collection_name=COLLECTION_NAME, field_name="source_type", field_schema="keyword")
+    except: pass
+
+    print(f"Ingesting {path} ...")
+    stats = ingest_handbook(qdrant_client, get_embedder(), path, PageState(source="handbook"), open_answer_cache(), open_lexical_index())
+    print(f"Pages {stats['pages']}, unchanged {stats['unchanged']}, synced {stats['synced']}, removed {stats['removed']} "
+          f"(+{stats['added_chunks']} / -{stats['removed_chunks']} chunks)")
@@ -1,18 +1,24 @@
+import time
+BOOT_STARTED = time.perf_counter()  # cold-start clock: module import through first warm interaction
+
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
+from fastapi.responses import PlainTextResponse
 from nacl.signing import VerifyKey
 from nacl.exceptions import BadSignatureError
-from groq import Groq
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance, Filter, FieldCondition, MatchValue
-from fastembed import TextEmbedding
+from functools import lru_cache
 import os
 import httpx 
 import logging
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-import uuid
-import time
+import asyncio
+import sqlite3
+from embedding import get_embedder
+from query_cache import QueryCache
+from answer_cache import open_answer_cache, answer_key
+from bm25_index import open_lexical_index, reciprocal_rank_fusion, tokenize
+from context_builder import build_context, estimate_tokens
+from admission import Admission
+import metrics
+from metrics import Trace, use_trace, span, timed, record_usage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TheWatcher")
@@ -20,21 +26,62 @@ logger = logging.getLogger("TheWatcher")
 app = FastAPI()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 DISCORD_PUBLIC_KEY = os.getenv("DISCORD_PUBLIC_KEY")
-ITU_LINKS_STR = os.getenv("ITU_LINKS", "")
 UPDATE_SECRET = os.getenv("UPDATE_SECRET", "change_this_to_a_random_password") 
-
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # seconds between progressive webhook edits
+DISCORD_MAX_CONTENT = 2000
+KEYWORD_QUERY_MAX_TERMS = int(os.getenv("KEYWORD_QUERY_MAX_TERMS", "3"))  # queries this short skip the LLM rewrite
+SEARCH_LIMIT = 12
+SCORE_THRESHOLD = 0.30
+SERVERLESS = bool(os.getenv("VERCEL"))  # set by Vercel's runtime (vercel.json)
+# A serverless instance may be frozen right after the response, so there the warm-up is left to a cron on /warmup
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0" if SERVERLESS else "1") == "1"
+# Admission workers are tasks that outlive the request; there each answer runs as the request's own background task
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "0" if SERVERLESS else "1") == "1"
+INGEST_WORKER_IN_PROCESS = os.getenv("INGEST_WORKER_IN_PROCESS", "0") == "1"  # VECTOR_BACKEND=local can't share its folder with a worker process
+
+# Only what PING and health checks need is built at import time. The Groq/Qdrant clients (the
+# qdrant_client import alone is most of a second) and the ONNX model load on first use.
 try:
-    groq_client = Groq(api_key=GROQ_API_KEY)
-    qdrant_client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    discord_http = httpx.AsyncClient(timeout=15)  # pooled connection for webhook edits
     verify_key = VerifyKey(bytes.fromhex(DISCORD_PUBLIC_KEY))
-    embed_model = TextEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    logger.info("Clients initialized successfully.")
+    embedder = get_embedder()  # cheap: the model itself loads on the first embed
+    query_cache = QueryCache()
+    answer_cache = open_answer_cache()
+    lexical_index = open_lexical_index()
+    logger.info(f"Clients initialized successfully ({time.perf_counter() - BOOT_STARTED:.2f}s since boot).")
 except Exception as e:
     logger.error(f"Failed to initialize clients: {e}")
 
+
+def _timed(name, factory):
+    started = time.perf_counter()
+    client = factory()
+    logger.info(f"{name} ready in {time.perf_counter() - started:.2f}s")
+    return client
+
+@lru_cache(maxsize=None)
+def get_groq_client():
+    from groq import AsyncGroq
+    return _timed("Groq client", lambda: AsyncGroq(api_key=GROQ_API_KEY))
+
+@lru_cache(maxsize=None)
+def get_async_qdrant_client():
+    # Interaction path; in-process backends share the store the ingestion worker thread writes to
+    from vector_store import open_async_vector_store
+    return _timed("Async vector store", open_async_vector_store)
+
+def warm_up():
+    """Builds every lazy client and runs one embedding so the next interaction pays none of it."""
+    timings = {"model": round(embedder.warm_up(), 3)}
+    for name, getter in [("groq", get_groq_client), ("vector_store", get_async_qdrant_client)]:
+        started = time.perf_counter()
+        getter()
+        timings[name] = round(time.perf_counter() - started, 3)
+    logger.info(f"Warm-up done {time.perf_counter() - BOOT_STARTED:.2f}s after boot: {timings}")
+    return timings
+
 SYSTEM_PROMPT = (
     "You are The Watcher, an ancient and mystical observer of ITU created by faby0001. "
     "You speak with a slightly cryptic, magical tone, but your information is precise. "
@@ -49,177 +96,291 @@ SYSTEM_PROMPT = (
     "If the specific answer is missing, provide the closest relevant facts that might help the user."
 )
 
-def get_precision_content(url):
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=30)
-        if response.status_code != 200: 
-            return None 
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        #Avada Pricing Tables
-        for pricing in soup.select(".fusion-pricing-table"):
-            headers = [h.get_text(strip=True) for h in pricing.select(".panel-heading")]
-            prices = [p.get_text(strip=True) for p in pricing.select(".panel-body")]
-            features = [f.get_text(strip=True) for f in pricing.select(".list-group-item")]
-            pricing_text = f"\n=== FEE/PRICING DATA ===\nPlans: {', '.join(headers)}\nPrices: {', '.join(prices)}\nDetails: {', '.join(features)}\n========================\n"
-            pricing.replace_with(pricing_text)
-
-        #Standard Tables
-        for table in soup.find_all("table"):
-            table_str = "\n--- TABLE DATA ---\n"
-            rows = table.find_all("tr")
-            for row in rows:
-                cols = row.find_all(["td", "th"])
-                row_text = " | ".join(ele.get_text(strip=True) for ele in cols)
-                table_str += row_text + "\n"
-            table_str += "------------------\n"
-            table.replace_with(table_str)
-
-        noise_selectors = [".fusion-footer", ".fusion-header-wrapper", "#sliders-container", ".fusion-sliding-bar", ".fusion-page-title-bar", "#side-header", ".fusion-sharing-box", "script", "style", "iframe", "form", "nav"]
-        for selector in noise_selectors:
-            for element in soup.select(selector):
-                element.decompose()
-
-        main_content = soup.find(id="main")
-        text = main_content.get_text(separator="\n") if main_content else soup.get_text(separator="\n")
-
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        chunks = []
-        chunk_size = 12   
-        overlap = 4       
-        for i in range(0, len(lines), chunk_size - overlap):
-            window = lines[i : i + chunk_size]
-            if len(window) < 3: continue 
-            full_record = f"Source: {url}\nContent: " + "\n".join(window)
-            chunks.append(full_record)
-        return chunks
-    except Exception as e:
-        logger.error(f"Scrape error on {url}: {e}")
-        return None
+@lru_cache(maxsize=None)
+def get_job_queue():
+    # Ingestion runs in ingest_worker.py, a separate process; the API only enqueues and reports
+    from job_queue import JobQueue
+    return JobQueue()
 
-def discover_internal_links(seed_url):
+async def optimize_search_query(original_query: str) -> str:
     try:
-        response = requests.get(seed_url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        found_links = set()
-        base_domain = urlparse(seed_url).netloc
-
-        for link in soup.find_all('a', href=True):
-            full_url = urljoin(seed_url, link['href'])
-            if urlparse(full_url).netloc != base_domain: continue
-            if any(x in full_url for x in [".pdf", ".jpg", "#", "wp-content", "login", "feed"]): continue
-            if any(k in full_url for k in ["academics", "faculty", "program", "department", "admissions", "fee", "examinations", "research", "administration"]):
-                found_links.add(full_url)
-        return list(found_links)
-    except:
-        return []
-
-def run_smart_update():
-    logger.info("Starting scheduled web ingestion...")
-    seed_urls = [url.strip() for url in ITU_LINKS_STR.split(",") if url.strip()]
-    final_url_list = set(seed_urls)
-    
-    for seed in seed_urls:
-        discovered = discover_internal_links(seed)
-        final_url_list.update(discovered)
-    
-    urls_to_process = list(final_url_list)[:300]
-    logger.info(f"Targeting {len(urls_to_process)} pages.")
-
-    #Create indexes if missing
-    try:
-        qdrant_client.create_payload_index(collection_name="knowledge_base", field_name="url", field_schema="keyword")
-        qdrant_client.create_payload_index(collection_name="knowledge_base", field_name="source_type", field_schema="keyword")
-    except: pass
-
-    for url in urls_to_process:
-        new_chunks = get_precision_content(url)
-        if new_chunks is None:
-            continue # Skip failed pages, keep old data
-
-        try:
-            # 1. Vectorize
-            embeddings = list(embed_model.embed(new_chunks))
-            points = []
-            for doc, vector in zip(new_chunks, embeddings):
-                points.append(PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=vector.tolist(),
-                    payload={"text": doc, "source_type": "website", "url": url} 
-                ))
-
-            # 2. Delete old data for this specific URL
-            qdrant_client.delete(
-                collection_name="knowledge_base",
-                points_selector=Filter(must=[FieldCondition(key="url", match=MatchValue(value=url))])
+        with span("rewrite"):
+            completion = await get_groq_client().chat.completions.create(
+                messages=[
+                    {"role": "system", "content": "You are a database query optimizer. Convert the user's question into a string of factual keywords likely to appear in a university handbook or website. Output ONLY keywords."},
+                    {"role": "user", "content": f"User Input: '{original_query}'"}
+                ],
+                model="llama-3.3-70b-versatile",
+                temperature=0.3,
+                max_tokens=60
             )
-
-            # 3. Upload new data
-            qdrant_client.upsert(collection_name="knowledge_base", points=points)
-            time.sleep(1) # Polite delay
-        except Exception as e:
-            logger.error(f"DB Error on {url}: {e}")
-    
-    logger.info("Ingestion complete.")
-
-def optimize_search_query(original_query: str) -> str:
-    try:
-        completion = groq_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a database query optimizer. Convert the user's question into a string of factual keywords likely to appear in a university handbook or website. Output ONLY keywords."},
-                {"role": "user", "content": f"User Input: '{original_query}'"}
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.3,
-            max_tokens=60
-        )
+        record_usage("rewrite", completion.usage)
         return completion.choices[0].message.content
     except:
         return original_query 
 
-async def process_and_respond(interaction_token: str, application_id: str, user_query: str):
+async def resolve_search_query(user_query: str):
+    # Repeat questions skip the LLM rewrite and the embedding entirely
+    cached = query_cache.get(user_query)
+    metrics.CACHE_REQUESTS.inc(cache="query", result="hit" if cached else "miss")
+    if cached:
+        return cached
+
+    if query_cache.semantic:
+        with span("embed_probe"):
+            probe = await embedder.embed_query_async(user_query)
+        cached = query_cache.get_similar(probe)
+        metrics.CACHE_REQUESTS.inc(cache="query_semantic", result="hit" if cached else "miss")
+        if cached:
+            return cached
+    else:
+        probe = None
+
+    # Terse keyword queries ("fee?", "dean?") are exactly what BM25 is good at, so they skip the LLM hop
+    keyword_query = await is_keyword_query(user_query)
+    # Under load the rewrite is the first Groq call to go: the raw question still retrieves, just less sharply
+    degraded = not keyword_query and admission is not None and not admission.allow_optional_call()
+    if degraded:
+        trace = metrics.current_trace()
+        if trace:
+            trace.fields["degraded"] = True
+    search_query = user_query if keyword_query or degraded else await optimize_search_query(user_query)
+    with span("embed"):
+        query_vector = await embedder.embed_query_async(search_query)
+    if keyword_query or search_query != user_query:  # don't pin the fallback from a failed rewrite
+        query_cache.put(user_query, search_query, query_vector, probe)
+    return search_query, query_vector
+
+async def is_keyword_query(user_query: str) -> bool:
+    if lexical_index is None or len(tokenize(user_query)) > KEYWORD_QUERY_MAX_TERMS:
+        return False
+    # The COUNT(*) waits on the lock a BM25 search holds, so it never runs on the event loop
+    return lexical_index.nonempty or await asyncio.to_thread(lexical_index.has_documents)
+
+async def retrieve(user_query: str, search_query: str, query_vector):
+    """Vector hits above the score cutoff, fused with BM25 hits by reciprocal rank when the local index exists."""
+    vector_search = timed("vector_search", get_async_qdrant_client().search(
+        collection_name="knowledge_base",
+        query_vector=query_vector,
+        limit=SEARCH_LIMIT
+    ))
+    if lexical_index is None:
+        search_results, lexical_hits = await vector_search, []
+    else:
+        lexical_query = user_query if search_query == user_query else f"{user_query} {search_query}"
+        search_results, lexical_hits = await asyncio.gather(
+            vector_search,
+            timed("lexical_search", asyncio.to_thread(lexical_index.search, lexical_query, SEARCH_LIMIT)),
+        )
+    for hit in search_results:
+        metrics.RETRIEVAL_SCORES.observe(hit.score)
+    vector_hits = [hit for hit in search_results if hit.score > SCORE_THRESHOLD]
+    metrics.RETRIEVED_CHUNKS.observe(len(vector_hits), source="vector")
+    if lexical_index is None:
+        return vector_hits
+    metrics.RETRIEVED_CHUNKS.observe(len(lexical_hits), source="lexical")
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], limit=SEARCH_LIMIT)
+
+async def edit_original(webhook_url: str, content: str):
+    """PATCH the deferred reply. Returns seconds to back off if Discord rate-limited us, else 0; raises on other errors."""
+    with span("webhook"):
+        response = await discord_http.patch(webhook_url, json={"content": content[:DISCORD_MAX_CONTENT]})
+    metrics.WEBHOOK_EDITS.inc(status=response.status_code)
+    if response.status_code == 429:
+        try:
+            return float(response.json().get("retry_after", STREAM_EDIT_INTERVAL))
+        except ValueError:
+            return STREAM_EDIT_INTERVAL
+    response.raise_for_status()  # any other error is not a delivered edit
+    return 0
+
+async def stream_completion(messages, webhook_url: str) -> str:
+    # Show the answer as it is generated; the caller still makes the final edit with the full text
+    stream = await get_groq_client().chat.completions.create(
+        messages=messages,
+        model="llama-3.3-70b-versatile",
+        temperature=0.5,
+        stream=True,
+    )
+    parts = []
+    next_edit = time.monotonic() + 0.3  # first edit as soon as there is something worth showing
+    async for chunk in stream:
+        x_groq = getattr(chunk, "x_groq", None)
+        if x_groq is not None:
+            record_usage("answer", getattr(x_groq, "usage", None))
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        if not parts:
+            trace = metrics.current_trace()
+            if trace:
+                trace.fields["first_token_s"] = round(time.perf_counter() - trace.started, 4)
+        parts.append(delta)
+        if time.monotonic() >= next_edit:
+            try:
+                backoff = await edit_original(webhook_url, "".join(parts) + " ▌")
+            except Exception as e:
+                # A lost preview edit isn't worth the answer being generated; the final edit carries it
+                logger.warning(f"Progressive webhook edit failed: {e}")
+                backoff = 0
+            next_edit = time.monotonic() + max(STREAM_EDIT_INTERVAL, backoff)
+    return "".join(parts)
+
+def webhook_url_for(interaction_token: str, application_id: str) -> str:
+    return f"https://discord.com/api/v10/webhooks/{application_id}/{interaction_token}/messages/@original"
+
+async def deliver(webhook_url: str, content: str) -> bool:
+    # The final edit must land even if the progressive edits ran into Discord's rate limit
     try:
-        search_query = optimize_search_query(user_query)
-        logger.info(f"Original: '{user_query}' -> Optimized: '{search_query}'")
+        for _ in range(3):
+            backoff = await edit_original(webhook_url, content)
+            if not backoff:
+                return True
+            await asyncio.sleep(backoff)
+        logger.error("Final webhook edit still rate limited after 3 attempts")
+        return False
+    except Exception as e:
+        logger.error(f"Final webhook edit failed: {e}")
+        return False
 
-        query_vector = list(embed_model.embed([search_query]))[0].tolist()
+async def cached_answer(cache_key: str):
+    # SQLite shared with the ingest worker: kept off the event loop, and a locked cache is just a miss
+    if not answer_cache:
+        return None
+    try:
+        ai_response = await asyncio.to_thread(answer_cache.get, cache_key)
+    except sqlite3.Error as e:
+        logger.error(f"Answer cache read failed: {e}")
+        ai_response = None
+    metrics.CACHE_REQUESTS.inc(cache="answer", result="miss" if ai_response is None else "hit")
+    return ai_response
+
+async def remember_answer(cache_key: str, ai_response: str, urls):
+    # The user already has this answer; failing to cache it must not turn it into an error
+    if not answer_cache:
+        return
+    try:
+        await asyncio.to_thread(answer_cache.put, cache_key, ai_response, urls)
+    except sqlite3.Error as e:
+        logger.error(f"Answer cache write failed: {e}")
+
+async def process_and_respond(interaction_token: str, application_id: str, user_query: str, trace: Trace = None) -> str:
+    webhook_url = webhook_url_for(interaction_token, application_id)
+    with use_trace(trace or Trace("answer", query=user_query)) as trace:
+        return await _answer(webhook_url, user_query, trace)
+
+async def answer_waiters(waiters):
+    # Coalesced interactions: the first asker gets the streamed answer, the rest its final text
+    ai_response = await process_and_respond(*waiters[0])
+    delivered = 1
+    while delivered < len(waiters):  # more can join while we deliver
+        interaction_token, application_id, _ = waiters[delivered]
+        ok = await deliver(webhook_url_for(interaction_token, application_id), ai_response)
+        metrics.INTERACTIONS.inc(outcome="coalesced" if ok else "undelivered")
+        delivered += 1
+
+admission = Admission(answer_waiters) if ADMISSION_CONTROL else None
+
+async def _answer(webhook_url: str, user_query: str, trace: Trace):
+    # Every stage below records a span on `trace`; the whole breakdown is logged as one JSON line at the end
+    outcome = "answered"
+    relevant_hits = []
+    try:
+        search_query, query_vector = await resolve_search_query(user_query)
+        trace.fields["search_query"] = search_query
         
-        search_results = qdrant_client.search(
-            collection_name="knowledge_base",
-            query_vector=query_vector,
-            limit=12
-        )
-
-        relevant_text = [hit.payload['text'] for hit in search_results if hit.score > 0.30]
-        context_text = "\n\n".join(relevant_text) if relevant_text else "The archives revealed no specific records matching this vibration."
-
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
+        relevant_hits = await retrieve(user_query, search_query, query_vector)
+        # Overlapping windows merged, repeats dropped, MMR-ordered and packed into CONTEXT_TOKEN_BUDGET
+        with span("context"):
+            context_text, passages = build_context(relevant_hits)
+        context_tokens = estimate_tokens(context_text)
+        metrics.CONTEXT_TOKENS.observe(context_tokens)
+        trace.fields.update(passages=len(passages), context_tokens=context_tokens,
+                            raw_context_tokens=sum(estimate_tokens(hit.payload['text']) for hit in relevant_hits))
+        context_text = context_text or "The archives revealed no specific records matching this vibration."
+
+        cache_key = answer_key(user_query, [hit.id for hit in relevant_hits])
+        ai_response = await cached_answer(cache_key)
+        if ai_response is None:
+            messages = [
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": f"Context from Archives:\n{context_text}\n\nUser Question: {user_query}"}
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.5,
-        )
-        
-        ai_response = chat_completion.choices[0].message.content
+            ]
+            if admission is not None:
+                with span("llm_wait"):
+                    await admission.llm_call()
+            with span("completion"):
+                if STREAM_ANSWERS:
+                    ai_response = await stream_completion(messages, webhook_url)
+                else:
+                    chat_completion = await get_groq_client().chat.completions.create(
+                        messages=messages,
+                        model="llama-3.3-70b-versatile",
+                        temperature=0.5,
+                    )
+                    record_usage("answer", chat_completion.usage)
+                    ai_response = chat_completion.choices[0].message.content
+            await remember_answer(cache_key, ai_response, [hit.payload.get('url', '') for hit in relevant_hits])
+        else:
+            outcome = "cached"
 
     except Exception as e:
-        logger.error(f"Error in background task: {e}")
+        # The user sees one in-character message; the trace records which stage failed and why
+        logger.error(f"Error in background task ({trace.error or type(e).__name__}): {e}")
+        outcome = "error"
         ai_response = "A temporal disturbance interrupted my thought process. (Internal Error)"
 
-    webhook_url = f"https://discord.com/api/v10/webhooks/{application_id}/{interaction_token}/messages/@original"
-    async with httpx.AsyncClient() as client:
-        await client.patch(webhook_url, json={"content": ai_response})
+    if not await deliver(webhook_url, ai_response):
+        outcome = "undelivered"
+    metrics.INTERACTIONS.inc(outcome=outcome)
+    trace.log(outcome=outcome, chunks=len(relevant_hits))
+    return ai_response
+
+worker_stop = None
+
+@app.on_event("shutdown")
+async def close_clients():
+    if worker_stop:
+        worker_stop.set()
+    await discord_http.aclose()
+    if get_async_qdrant_client.cache_info().currsize:
+        await get_async_qdrant_client().close()
+
+@app.on_event("startup")
+async def schedule_warm_up():
+    # Off the request path: PING and / answer immediately while the model loads in a thread
+    if WARMUP_ON_STARTUP:
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+@app.on_event("startup")
+async def start_ingest_worker():
+    # A thread, not a BackgroundTask: the crawl shares the process but never holds up a request
+    global worker_stop
+    if INGEST_WORKER_IN_PROCESS:
+        import threading
+        from ingest_worker import run_worker
+        worker_stop = threading.Event()
+        threading.Thread(target=run_worker, kwargs={"queue": get_job_queue(), "stop": worker_stop}, name="ingest-worker", daemon=True).start()
 
 @app.get("/")
 async def home():
     return {"status": "Watcher is online"}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/warmup")
+async def warmup():
+    # For cron pings on serverless deploys; after the first call everything is cached and this is instant
+    timings = await asyncio.to_thread(warm_up)
+    return {"status": "warm", "seconds": timings, "since_boot": round(time.perf_counter() - BOOT_STARTED, 3)}
+
+BUSY_REPLIES = {
+    "rejected_user": "The Watcher is still pondering your last question. Ask again in {seconds}s.",
+    "rejected_busy": "Too many voices call to the Watcher at once. Ask again in {seconds}s.",
+}
+
 @app.post("/interactions")
 async def interactions(request: Request, background_tasks: BackgroundTasks):
     try:
@@ -240,17 +401,41 @@ async def interactions(request: Request, background_tasks: BackgroundTasks):
         user_query = options[0]["value"] if options else "Hello Watcher"
         interaction_token = data["token"]
         application_id = data["application_id"]
-        background_tasks.add_task(process_and_respond, interaction_token, application_id, user_query)
+        if admission is None:
+            background_tasks.add_task(process_and_respond, interaction_token, application_id, user_query)
+            return {"type": 5}
+        user = (data.get("member") or {}).get("user") or data.get("user") or {}
+        decision, retry_after = admission.submit(user.get("id", "anonymous"), user_query, (interaction_token, application_id, user_query))
+        if decision in BUSY_REPLIES:
+            # Answered inline and only to the asker (flag 64), so a rejection costs no webhook call
+            return {"type": 4, "data": {"content": BUSY_REPLIES[decision].format(seconds=max(1, round(retry_after))), "flags": 64}}
         return {"type": 5}
 
     return {"error": "Unknown type"}
 
-@app.post("/trigger-update")
-async def trigger_update(request: Request, background_tasks: BackgroundTasks):
+def require_update_secret(request: Request):
     #Security check to prevent random people from triggering it
     secret = request.query_params.get("secret")
     if secret != UPDATE_SECRET:
         raise HTTPException(status_code=403, detail="Forbidden")
-    
-    background_tasks.add_task(run_smart_update)
-    return {"status": "Update process started in background"}
\ No newline at end of file
+
+@app.post("/trigger-update")
+async def trigger_update(request: Request):
+    require_update_secret(request)
+    # Queued for the ingestion worker; a trigger while a run is queued or running returns that run
+    from ingest_worker import WEB_UPDATE
+    job, created = await asyncio.to_thread(get_job_queue().enqueue, WEB_UPDATE)
+    return {"status": "queued" if created else f"already {job['status']}", "job": job}
+
+@app.get("/jobs")
+async def list_jobs(request: Request):
+    require_update_secret(request)
+    return {"jobs": await asyncio.to_thread(get_job_queue().latest)}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: int, request: Request):
+    require_update_secret(request)
+    job = await asyncio.to_thread(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
@@ -0,0 +1,67 @@
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger("TheWatcher")
+
+STATE_PATH_ENV = {"web": "INGEST_STATE_PATH", "handbook": "HANDBOOK_STATE_PATH"}
+
+
+def default_state_path(source="web"):
+    """
+    The source's STATE_PATH_ENV variable if set, otherwise one file per source and vector store.
+    Hashes recorded against one store would make every page look unchanged to another, which would
+    then never be filled; and since each run rewrites its whole file, two sources sharing one would
+    drop each other's hashes.
+    """
+    if os.getenv(STATE_PATH_ENV[source]):
+        return os.getenv(STATE_PATH_ENV[source])
+    from vector_store import store_location
+    backend, target = store_location()
+    prefix = "ingest_state" if source == "web" else f"ingest_state.{source}"
+    return f"{prefix}.{backend}-{hashlib.sha256(target.encode('utf-8')).hexdigest()[:12]}.json"
+
+
+def content_hash(chunks):
+    # Normalize whitespace so cosmetic markup changes don't count as edits
+    normalized = "\n".join(" ".join(chunk.split()) for chunk in chunks)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class PageState:
+    """Per-URL crawl bookkeeping (ETag, Last-Modified, content hash) persisted as JSON."""
+
+    def __init__(self, path=None, source="web"):
+        self.path = path or default_state_path(source)
+        self.pages = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.pages = json.load(f).get("pages", {})
+            except (OSError, ValueError) as e:
+                logger.error(f"Ignoring unreadable ingest state {self.path}: {e}")
+
+    def get(self, url):
+        return self.pages.get(url, {})
+
+    def conditional_headers(self, url):
+        entry = self.get(url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url, **fields):
+        self.pages.setdefault(url, {}).update({k: v for k, v in fields.items() if v is not None})
+
+    def forget(self, url):
+        self.pages.pop(url, None)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,176 @@
+import os
+import sys
+import socket
+import logging
+import threading
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()  # before the repo modules read their settings, so the worker and the API agree on paths
+
+from job_queue import JobQueue
+
+logger = logging.getLogger("TheWatcher")
+
+WEB_UPDATE = "web_update"
+MAX_PAGES = 300
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))  # well inside JOB_LEASE_SECONDS
+PRUNE_MAX_FAILED_SHARE = float(os.getenv("PRUNE_MAX_FAILED_SHARE", "0.2"))  # a crawl failing more pages than this prunes nothing
+
+
+@lru_cache(maxsize=None)
+def _resources():
+    # Opened on first job, so `--enqueue` and an idle worker never load the model or the vector store
+    from embedding import get_embedder
+    from answer_cache import open_answer_cache
+    from bm25_index import open_lexical_index
+    from knowledge_base import QDRANT_PREFER_GRPC
+    from vector_store import open_vector_store
+    return open_vector_store(prefer_grpc=QDRANT_PREFER_GRPC), get_embedder(), open_answer_cache(), open_lexical_index()
+
+
+def store_pages(pages, sink=None):
+    # Embeds only new chunks (batched across pages), upserts them, then deletes the stale ones by ID
+    from knowledge_base import sync_pages
+    client, embedder, answer_cache, lexical_index = _resources()
+    added, removed = sync_pages(client, embedder.embed, pages, lexical_index=lexical_index, sink=sink)
+    logger.info(f"Synced {len(pages)} pages: +{added} / -{removed} chunks")
+    if answer_cache:
+        answer_cache.invalidate_urls([url for url, _ in pages])
+
+
+def run_web_update(checkpoint=None, resume=(), stop=None):
+    """Recursive crawl of ITU_LINKS into the knowledge base; returns the crawl stats. Setting `stop` ends it early."""
+    from qdrant_client.models import VectorParams, Distance
+    from crawler import run_ingestion
+    from extractor import get_precision_content, extract_links, link_priority
+    from ingest_state import PageState
+    from knowledge_base import QdrantSink, COLLECTION_NAME, remove_pages_outside
+
+    logger.info("Starting scheduled web ingestion...")
+    qdrant_client, _, answer_cache, lexical_index = _resources()
+    seed_urls = [url.strip() for url in os.getenv("ITU_LINKS", "").split(",") if url.strip()]
+
+    # Collection and the indexes that let us delete specific pages fast, if missing
+    if not qdrant_client.collection_exists(collection_name=COLLECTION_NAME):
+        qdrant_client.create_collection(collection_name=COLLECTION_NAME, vectors_config=VectorParams(size=384, distance=Distance.COSINE))
+    try:
+        qdrant_client.create_payload_index(collection_name=COLLECTION_NAME, field_name="url", field_schema="keyword")
+        qdrant_client.create_payload_index(collection_name=COLLECTION_NAME, field_name="source_type", field_schema="keyword")
+    except: pass
+
+    # Recursive crawl from the seeds (+ sitemaps); the page budget goes to the highest-priority pages
+    # Qdrant writes go through a write-behind sink; each checkpoint (and the end of the run) is a barrier
+    sink = QdrantSink(qdrant_client)
+    stats = run_ingestion(seed_urls, get_precision_content, lambda pages: store_pages(pages, sink), state=PageState(),
+                          links=extract_links, priority=link_priority, max_pages=MAX_PAGES, finalize=sink.barrier,
+                          checkpoint=checkpoint, resume=resume, stop=stop)
+    logger.info(f"Crawled {stats['pages']} pages: {stats['fetched']} fetched, {stats['unchanged']} unchanged, "
+                f"{stats['stored']} stored, {stats['resumed']} resumed, {stats['failed']} failed, {stats['gone']} gone in {stats['seconds']}s; "
+                f"stage seconds {stats['stage_seconds']}")
+
+    # Website points outside this crawl -- dropped pages, URLs stored before normalize_url -- would stay retrievable
+    # forever, and so would pages that now answer 404/410. Pages that failed this time are kept.
+    if crawl_is_complete(stats):
+        try:
+            removed_urls = remove_pages_outside(qdrant_client, set(stats["urls"]) - set(stats["gone_urls"]), lexical_index=lexical_index)
+            stats["legacy_urls_removed"] = len(removed_urls)
+            if answer_cache:
+                answer_cache.invalidate_urls(removed_urls)
+        except Exception as e:
+            logger.error(f"Legacy cleanup skipped: {e}")
+    else:
+        logger.warning(f"Legacy cleanup skipped: the crawl did not see enough of the site ({stats['pages']} pages, "
+                       f"{stats['failed']} failed, {stats['seeds_failed']} seeds failed, stopped={stats['stopped']})")
+    logger.info("Ingestion complete.")
+    return stats
+
+
+def crawl_is_complete(stats):
+    # Pruning deletes whatever the crawl did not see, so a dead seed, a site mostly failing (down, blocking us)
+    # or a stopped run must not prune: with an empty state file that would wipe the website corpus
+    return (stats["pages"] > 0 and not stats["stopped"] and not stats["seeds_failed"]
+            and stats["failed"] <= PRUNE_MAX_FAILED_SHARE * stats["pages"])
+
+
+JOBS = {WEB_UPDATE: run_web_update}
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_job(queue, job, worker):
+    """
+    Runs one claimed job to completion, heartbeating its lease from a side thread. If the lease is
+    lost (a stall longer than JOB_LEASE_SECONDS), the crawl stops taking pages and the job is left
+    to whichever worker claims it next.
+    """
+    from crawler import summary
+    resume = queue.completed_urls(job["id"])
+    if resume:
+        logger.info(f"Resuming job {job['id']} (attempt {job['attempts']}): {len(resume)} pages already done")
+    done = threading.Event()
+    lost = threading.Event()
+
+    def lease_lost():
+        if not lost.is_set():
+            logger.warning(f"Job {job['id']} is no longer leased to {worker}; stopping")
+            lost.set()
+
+    def beat():
+        while not done.wait(HEARTBEAT_SECONDS):
+            if not queue.heartbeat(job["id"], worker):
+                lease_lost()
+                return
+
+    def checkpoint(entries, progress):
+        if not queue.checkpoint(job["id"], worker, entries, progress):
+            lease_lost()
+
+    heart = threading.Thread(target=beat, name=f"job-{job['id']}-heartbeat", daemon=True)
+    heart.start()
+    try:
+        stats = JOBS[job["kind"]](checkpoint, resume, lost)
+        if lost.is_set():
+            logger.warning(f"Job {job['id']} stopped after {stats['pages']} pages; not finishing a job that is no longer ours")
+        else:
+            queue.finish(job["id"], worker, "succeeded", summary(stats))
+    except Exception as e:
+        logger.error(f"Job {job['id']} ({job['kind']}) failed: {e}")
+        if not lost.is_set():
+            queue.finish(job["id"], worker, "failed", error=f"{type(e).__name__}: {e}")
+    finally:
+        done.set()
+        heart.join()
+
+
+def run_worker(queue=None, once=False, stop=None):
+    """Claims and runs jobs until `stop` is set (or, with once=True, until the queue is empty)."""
+    queue = queue or JobQueue()
+    stop = stop or threading.Event()
+    worker = worker_id()
+    logger.info(f"Ingestion worker {worker} started")
+    while not stop.is_set():
+        job = queue.claim(worker)
+        if job is None:
+            if once:
+                return
+            stop.wait(POLL_SECONDS)
+            continue
+        logger.info(f"Job {job['id']} ({job['kind']}) claimed by {worker}")
+        run_job(queue, job, worker)
+
+
+if __name__ == "__main__":
+    # python ingest_worker.py             -> long-running worker next to the API
+    # python ingest_worker.py --once      -> run whatever is queued, then exit (cron)
+    # python ingest_worker.py --enqueue   -> queue a web update (no-op if one is already queued or running)
+    logging.basicConfig(level=logging.INFO)
+    queue = JobQueue()
+    if "--enqueue" in sys.argv:
+        job, created = queue.enqueue(WEB_UPDATE)
+        print(f"Job {job['id']} {'queued' if created else 'already ' + job['status']}")
+    else:
+        run_worker(queue, once="--once" in sys.argv)
@@ -1,21 +1,36 @@
-from qdrant_client import QdrantClient
-from fastembed import TextEmbedding
-from dotenv import load_dotenv
 import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+import subprocess
+from types import SimpleNamespace
+from dotenv import load_dotenv
 
 load_dotenv()
 
-# Setup
-client = QdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
-model = TextEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+# python inspect_data.py --peek "Fee Structure"      -> eyeball the top hits in the configured store
+# python inspect_data.py [--corpus bench_corpus]     -> offline benchmark: ingest the saved corpus into a
+#                                                       throwaway index, then score the fixed question set
+QUESTIONS_PATH = "bench_questions.json"
+RESULTS_DIR = "bench_results"
 collection = "knowledge_base"
 
+
 def peek_inside(search_term):
+    from embedding import get_embedder
+    from vector_store import open_vector_store
+
+    client = open_vector_store()  # VECTOR_BACKEND=memory/local inspects the offline index
     print(f"\n--- 🔍 SEARCHING FOR: '{search_term}' ---")
-    
+
     # Convert text to vector
-    vector = list(model.embed([search_term]))[0].tolist()
-    
+    vector = get_embedder().embed_query(search_term)
+
     # Search DB
     results = client.search(
         collection_name=collection,
@@ -28,9 +43,289 @@ def peek_inside(search_term):
         print(f"Source: {hit.payload.get('source_type', 'Unknown')}")
         print("-" * 30)
         # Print the actual text the bot reads
-        print(hit.payload['text']) 
+        print(hit.payload['text'])
         print("-" * 30)
 
+
+def percentiles(samples):
+    """Seconds -> {p50, p95, p99, mean} in milliseconds (nearest-rank, so small runs stay honest)."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    rank = lambda q: ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+    return {"p50": round(rank(0.50) * 1000, 2), "p95": round(rank(0.95) * 1000, 2),
+            "p99": round(rank(0.99) * 1000, 2), "mean": round(sum(ordered) / len(ordered) * 1000, 2), "n": len(ordered)}
+
+
+class FakeGroq:
+    """
+    Local stand-in for AsyncGroq: fixed latency, a steady token rate and deterministic output.
+    The query rewrite returns the question's content terms; answers stream a canned reply.
+    """
+
+    def __init__(self, latency=0.25, tokens_per_second=250):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, model=None, temperature=None, max_tokens=None, stream=False):
+        from bm25_index import tokenize
+
+        await asyncio.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        if "query optimizer" in messages[0]["content"]:
+            text = " ".join(tokenize(prompt.replace("User Input:", "")))
+        else:
+            text = "The archives speak: " + " ".join(["the records show what you seek."] * 12)
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"]) for m in messages) // 4, completion_tokens=len(text) // 4)
+        if not stream:
+            await asyncio.sleep(usage.completion_tokens / self.tokens_per_second)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+        return self._stream(text, usage)
+
+    async def _stream(self, text, usage):
+        words = text.split(" ")
+        for word in words:
+            await asyncio.sleep(usage.completion_tokens / self.tokens_per_second / len(words))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))], x_groq=None)
+        yield SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=usage))
+
+
+def load_bot(workdir, args):
+    """Imports index.py against throwaway stores in `workdir`, with Groq and Discord replaced by local fakes."""
+    if not args.skip_ingest:
+        os.environ["VECTOR_BACKEND"] = args.backend
+        os.environ["VECTOR_INDEX_DIR"] = os.path.join(workdir, "vector_index")
+        os.environ["QDRANT_PATH"] = os.path.join(workdir, "qdrant")
+        os.environ["BM25_INDEX_PATH"] = os.path.join(workdir, "bm25.sqlite3")
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(workdir, "embeddings.sqlite3")
+    os.environ["ANSWER_CACHE_PATH"] = os.path.join(workdir, "answers.sqlite3")
+    os.environ.setdefault("DISCORD_PUBLIC_KEY", "00" * 32)
+
+    import httpx
+    import index
+    from query_cache import QueryCache
+
+    logging.getLogger("TheWatcher").setLevel(logging.INFO if args.verbose else logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    fake_groq = FakeGroq(args.llm_latency, args.llm_tps)
+    index.get_groq_client = lambda: fake_groq
+    index.discord_http = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+    index.admission = None  # measure the pipeline, not the production Groq rate limits
+    if args.threshold is not None:
+        index.SCORE_THRESHOLD = args.threshold
+    if not args.with_caches:
+        # Every question should take the full path; ttl=0 expires entries the moment they are written
+        index.query_cache = QueryCache(ttl=0, similarity=0)
+        index.answer_cache = None
+    return index
+
+
+def load_corpus(corpus_dir):
+    names = {}
+    urls_path = os.path.join(corpus_dir, "urls.json")
+    if os.path.exists(urls_path):
+        with open(urls_path, "r", encoding="utf-8") as f:
+            names = json.load(f)
+    pages = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith(".html"):
+            with open(os.path.join(corpus_dir, name), "rb") as f:
+                pages.append((names.get(name, name), f.read()))
+    return pages
+
+
+def ingest(index, pages, args, workdir):
+    """Parse + embed + write the corpus through the ingestion worker's store_pages(); returns pages/s and stage totals."""
+    from chunking import chunk_text
+    from extractor import extract_text
+    from embedding import EMBED_BATCH_SIZE
+    from knowledge_base import QdrantSink, COLLECTION_NAME
+    from ingest_worker import store_pages, _resources
+    from metrics import Trace, use_trace, span
+    from qdrant_client.models import VectorParams, Distance
+
+    client, embedder, _, lexical_index = _resources()
+    if not client.collection_exists(collection_name=COLLECTION_NAME):
+        client.create_collection(collection_name=COLLECTION_NAME, vectors_config=VectorParams(size=384, distance=Distance.COSINE))
+
+    run = Trace("bench_ingest")
+    started = time.perf_counter()
+    chunks_total = 0
+    with use_trace(run):
+        sink = QdrantSink(client)
+        batch = []
+        for url, content in pages:
+            with span("parse"):
+                chunks = chunk_text(extract_text(content), url, args.chunk_size, args.overlap)
+            batch.append((url, chunks))
+            chunks_total += len(chunks)
+            if sum(len(c) for _, c in batch) >= EMBED_BATCH_SIZE:
+                store_pages(batch, sink)
+                batch = []
+        if batch:
+            store_pages(batch, sink)
+        with span("barrier"):
+            sink.barrier()
+        handbook_pages = 0
+        if args.handbook:
+            from handbook_ingest import ingest_handbook
+            from ingest_state import PageState
+            handbook_pages = ingest_handbook(client, embedder, args.handbook, PageState(os.path.join(workdir, "handbook_state.json")),
+                                             None, lexical_index)["pages"]
+    seconds = time.perf_counter() - started
+    total_pages = len(pages) + handbook_pages
+    return {"pages": total_pages, "web_pages": len(pages), "handbook_pages": handbook_pages, "web_chunks": chunks_total,
+            "seconds": round(seconds, 3), "pages_per_s": round(total_pages / seconds, 2) if seconds else None,
+            "stage_seconds": {stage: round(value, 3) for stage, value in run.stages.items()}}
+
+
+async def evaluate(index, questions, k):
+    """recall@1/3/k and MRR against labeled source URL fragments, plus per-stage latency of the retrieval path."""
+    from metrics import Trace, use_trace
+
+    stage_samples, totals, ranks, misses = {}, [], [], []
+    for item in questions:
+        with use_trace(Trace("bench_retrieve")) as trace:
+            started = time.perf_counter()
+            search_query, query_vector = await index.resolve_search_query(item["question"])
+            hits = await index.retrieve(item["question"], search_query, query_vector)
+            totals.append(time.perf_counter() - started)
+        for stage, seconds in trace.stages.items():
+            stage_samples.setdefault(stage, []).append(seconds)
+        urls = [hit.payload.get("url", "") for hit in hits]
+        rank = next((position for position, url in enumerate(urls, 1) if any(source in url for source in item["sources"])), None)
+        ranks.append(rank)
+        if rank is None or rank > k:
+            misses.append({"question": item["question"], "top_urls": urls[:3]})
+
+    recall = lambda cutoff: round(sum(1 for rank in ranks if rank and rank <= cutoff) / len(ranks), 3)
+    return {"questions": len(questions), "recall@1": recall(1), "recall@3": recall(3), f"recall@{k}": recall(k),
+            "mrr": round(sum(1 / rank for rank in ranks if rank) / len(ranks), 3),
+            "latency_ms": {"total": percentiles(totals), **{stage: percentiles(samples) for stage, samples in stage_samples.items()}},
+            "misses": misses}
+
+
+async def load_test(index, questions, concurrency, rounds):
+    """The whole interaction (process_and_respond: retrieval, fake LLM, fake webhook) under `concurrency` simultaneous users."""
+    from metrics import Trace
+
+    gate = asyncio.Semaphore(concurrency)
+    traces = []
+
+    async def one(question):
+        async with gate:
+            trace = Trace("bench_answer", query=question)
+            await index.process_and_respond("bench-token", "bench-app", question, trace)
+            traces.append((trace, time.perf_counter() - trace.started))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(item["question"]) for _ in range(rounds) for item in questions))
+    wall = time.perf_counter() - started
+    stages = {}
+    for trace, _ in traces:
+        for stage, seconds in trace.stages.items():
+            stages.setdefault(stage, []).append(seconds)
+    return {"concurrency": concurrency, "requests": len(traces), "errors": sum(1 for trace, _ in traces if trace.error),
+            "seconds": round(wall, 3), "throughput_rps": round(len(traces) / wall, 2),
+            "latency_ms": {"total": percentiles([total for _, total in traces]), **{stage: percentiles(samples) for stage, samples in stages.items()}}}
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = flatten(json.load(f))
+    print(f"\n--- vs {baseline_path} ---")
+    for key, value in flatten(current).items():
+        if key.startswith("config.") or key not in baseline or baseline[key] == value:
+            continue
+        old = baseline[key]
+        change = f"{(value - old) / old * 100:+.1f}%" if old else "new"
+        print(f"{key:<48} {old:>10} -> {value:<10} {change}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(args):
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix="watcher-bench-") as workdir:
+        index = load_bot(workdir, args)
+        warm_up = index.embedder.warm_up()  # model load is a cold-start cost, not a per-query one
+        results = {"config": {"revision": git_revision(), "backend": os.getenv("VECTOR_BACKEND", "remote"),
+                              "chunk_size": args.chunk_size, "overlap": args.overlap, "threshold": index.SCORE_THRESHOLD,
+                              "search_limit": index.SEARCH_LIMIT, "k": args.k, "caches": args.with_caches,
+                              "llm_latency": args.llm_latency, "llm_tps": args.llm_tps, "questions": args.questions},
+                   "model_warm_up_s": round(warm_up, 3)}
+
+        if not args.skip_ingest:
+            if not os.path.isdir(args.corpus):
+                print(f"No corpus at {args.corpus}/ -- run python bench_extract.py --fetch first, or use --skip-ingest.")
+                sys.exit(1)
+            results["ingest"] = ingest(index, load_corpus(args.corpus), args, workdir)
+            print(f"Ingested {results['ingest']['pages']} pages in {results['ingest']['seconds']}s "
+                  f"({results['ingest']['pages_per_s']} pages/s): {results['ingest']['stage_seconds']}")
+
+        results["retrieval"] = asyncio.run(evaluate(index, questions, args.k))
+        retrieval = results["retrieval"]
+        print(f"recall@1 {retrieval['recall@1']}  recall@3 {retrieval['recall@3']}  recall@{args.k} {retrieval[f'recall@{args.k}']}  MRR {retrieval['mrr']}")
+        for stage, numbers in retrieval["latency_ms"].items():
+            print(f"   {stage:<16} p50 {numbers['p50']:>8} ms   p95 {numbers['p95']:>8} ms   p99 {numbers['p99']:>8} ms")
+        for miss in retrieval["misses"]:
+            print(f"   miss: {miss['question']!r} -> {miss['top_urls']}")
+
+        results["load"] = asyncio.run(load_test(index, questions, args.concurrency, args.rounds))
+        load = results["load"]
+        print(f"{load['requests']} answers at concurrency {load['concurrency']}: {load['throughput_rps']} req/s, "
+              f"p50 {load['latency_ms']['total']['p50']} ms, p99 {load['latency_ms']['total']['p99']} ms, {load['errors']} errors")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+    print(f"Saved {out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
 if __name__ == "__main__":
-    #change this to whatever is missing
-    peek_inside("Fee Structure")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Offline retrieval/latency benchmark for The Watcher.")
+    parser.add_argument("--peek", metavar="TERM", help="just print the top 3 hits for TERM from the configured store")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--corpus", default="bench_corpus", help="saved HTML from bench_extract.py --fetch")
+    parser.add_argument("--handbook", help="also ingest this PDF into the offline index")
+    parser.add_argument("--skip-ingest", action="store_true", help="score the configured store instead of a fresh offline index")
+    parser.add_argument("--backend", choices=["memory", "local"], default="memory")
+    parser.add_argument("--chunk-size", type=int, default=12)
+    parser.add_argument("--overlap", type=int, default=4)
+    parser.add_argument("--threshold", type=float, help="override SCORE_THRESHOLD")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the question set in the load test")
+    parser.add_argument("--llm-latency", type=float, default=0.25, help="fake Groq time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=250, help="fake Groq tokens per second")
+    parser.add_argument("--with-caches", action="store_true", help="keep the query/answer caches on")
+    parser.add_argument("--out", help="results file (default bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", metavar="RESULTS", help="print changes against an earlier results file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.peek:
+        peek_inside(args.peek)
+    else:
+        main(args)
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("TheWatcher")
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.sqlite3")
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))  # a running job with an older heartbeat is presumed dead
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+RESUMABLE_OUTCOMES = ("stored", "unchanged", "not_modified")  # checkpointed pages a retry doesn't fetch again
+
+
+class JobQueue:
+    """
+    Durable ingestion jobs in SQLite, shared by the API (enqueue, status) and the worker process (claim, run).
+    - Single flight: a partial unique index allows one queued-or-running job per kind, so a second
+      trigger gets the job already in progress instead of a concurrent crawl.
+    - Leases: the worker heartbeats while it runs; a job whose heartbeat is older than JOB_LEASE_SECONDS
+      is handed to the next worker that asks, up to JOB_MAX_ATTEMPTS attempts.
+    - Checkpoints: per-URL outcomes of the current job, so a retried job skips pages already done.
+    """
+
+    def __init__(self, path=JOB_DB_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")  # status reads never wait on the worker's writes
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, status TEXT, created REAL, started REAL,
+                finished REAL, heartbeat REAL, worker TEXT, attempts INTEGER DEFAULT 0,
+                progress TEXT, result TEXT, error TEXT
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS jobs_single_flight ON jobs (kind) WHERE status IN ('queued', 'running');
+            CREATE TABLE IF NOT EXISTS checkpoints (job_id INTEGER, url TEXT, outcome TEXT, at REAL, PRIMARY KEY (job_id, url));
+        """)
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can't claim the same job
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def enqueue(self, kind):
+        """(job, created): a new queued job, or the queued/running one of this kind if there is one."""
+        with self._transaction() as db:
+            active = db.execute("SELECT * FROM jobs WHERE kind = ? AND status IN ('queued', 'running')", (kind,)).fetchone()
+            if active:
+                return self._job(active), False
+            cursor = db.execute("INSERT INTO jobs (kind, status, created) VALUES (?, 'queued', ?)", (kind, time.time()))
+            return self._job(db.execute("SELECT * FROM jobs WHERE id = ?", (cursor.lastrowid,)).fetchone()), True
+
+    def claim(self, worker):
+        """Leases the oldest queued job (or one whose worker stopped heartbeating) to `worker`."""
+        now = time.time()
+        with self._transaction() as db:
+            for row in db.execute("SELECT id, attempts, worker FROM jobs WHERE status = 'running' AND heartbeat < ?",
+                                  (now - self.lease_seconds,)).fetchall():
+                logger.warning(f"Job {row['id']} lost its worker {row['worker']} (attempt {row['attempts']})")
+                if row["attempts"] >= self.max_attempts:
+                    db.execute("UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE id = ?",
+                               (now, f"worker lost {row['attempts']} times", row["id"]))
+                else:
+                    db.execute("UPDATE jobs SET status = 'queued' WHERE id = ?", (row["id"],))
+            row = db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'running', worker = ?, started = COALESCE(started, ?), heartbeat = ?, "
+                       "attempts = attempts + 1 WHERE id = ?", (worker, now, now, row["id"]))
+            return self._job(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def heartbeat(self, job_id, worker, progress=None):
+        """Extends the lease; False if the job is no longer this worker's."""
+        with self.lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET heartbeat = ?, progress = COALESCE(?, progress) WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), json.dumps(progress) if progress is not None else None, job_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def checkpoint(self, job_id, worker, entries, progress=None):
+        """Records (url, outcome) pairs the crawl has made durable, and the run's progress so far."""
+        now = time.time()
+        with self._transaction() as db:
+            db.executemany("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)", [(job_id, url, outcome, now) for url, outcome in entries])
+        return self.heartbeat(job_id, worker, progress)
+
+    def completed_urls(self, job_id):
+        marks = ",".join("?" * len(RESUMABLE_OUTCOMES))
+        with self.lock:
+            rows = self.db.execute(f"SELECT url FROM checkpoints WHERE job_id = ? AND outcome IN ({marks})",
+                                   (job_id, *RESUMABLE_OUTCOMES)).fetchall()
+        return {row["url"] for row in rows}
+
+    def finish(self, job_id, worker, status, result=None, error=None):
+        # A no-op once the lease has expired, even before another worker has claimed the job
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, result = ?, error = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, time.time(), json.dumps(result, default=str) if result is not None else None, error, job_id, worker),
+            )
+
+    def get(self, job_id):
+        """The job plus a count of its checkpointed pages by outcome, or None."""
+        with self.lock:
+            job = self._job(self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+            if job:
+                job["checkpoints"] = {row["outcome"]: row["pages"] for row in self.db.execute(
+                    "SELECT outcome, COUNT(*) AS pages FROM checkpoints WHERE job_id = ? GROUP BY outcome", (job_id,))}
+        return job
+
+    def latest(self, kind=None, limit=10):
+        with self.lock:
+            if kind:
+                rows = self.db.execute("SELECT * FROM jobs WHERE kind = ? ORDER BY id DESC LIMIT ?", (kind, limit)).fetchall()
+            else:
+                rows = self.db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._job(row) for row in rows]
@@ -0,0 +1,185 @@
+import os
+import hashlib
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from qdrant_client.models import PointStruct, PointIdsList, Filter, FieldCondition, MatchAny, MatchValue
+from metrics import span
+
+logger = logging.getLogger("TheWatcher")
+
+COLLECTION_NAME = "knowledge_base"
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "1") == "1"  # ingestion clients; gRPC is cheaper for bulk writes
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "512"))     # points per write-behind flush
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))             # flushes in flight at once
+
+
+def chunk_id(url, text):
+    # Same URL + same text -> same point ID, so unchanged chunks are never re-embedded
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{url}#{digest}"))
+
+
+def existing_chunk_ids(client, urls, collection_name=COLLECTION_NAME):
+    """url -> set of point IDs, for a whole batch of pages in one paginated scroll."""
+    ids = {url: set() for url in urls}
+    if not ids:
+        return ids
+    offset = None
+    url_filter = Filter(must=[FieldCondition(key="url", match=MatchAny(any=list(ids)))])
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=url_filter,
+            limit=256,
+            offset=offset,
+            with_payload=["url"],
+            with_vectors=False,
+        )
+        for point in points:
+            ids.setdefault(point.payload.get("url"), set()).add(str(point.id))
+        if offset is None:
+            return ids
+
+
+class QdrantSink:
+    """
+    Write-behind buffer for ingestion. Points and stale IDs from many pages are collected and
+    flushed in UPSERT_BATCH_SIZE batches on background threads with wait=False, so the crawl never
+    waits on a Qdrant round trip. Each flush uploads before it deletes, so pages stay searchable.
+    barrier() drains everything and confirms the writes landed; it returns the URLs whose writes failed.
+    """
+
+    def __init__(self, client, collection_name=COLLECTION_NAME, batch_size=UPSERT_BATCH_SIZE, workers=UPLOAD_WORKERS):
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qdrant-sink")
+        self.lock = threading.Lock()
+        self.points, self.stale_ids, self.urls = [], [], []
+        self.futures = []
+        self.last_point = None
+
+    def add(self, urls, points, stale_ids):
+        with self.lock:
+            self.points.extend(points)
+            self.stale_ids.extend(stale_ids)
+            self.urls.extend(urls)
+            if points:
+                self.last_point = points[-1]
+            if len(self.points) + len(self.stale_ids) >= self.batch_size:
+                self._submit()
+
+    def _submit(self):
+        points, stale_ids, urls = self.points, self.stale_ids, self.urls
+        self.points, self.stale_ids, self.urls = [], [], []
+        if points or stale_ids:
+            self.futures.append((urls, self.executor.submit(self._write, points, stale_ids, wait=False)))
+
+    def _write(self, points, stale_ids, wait):
+        if points:
+            self.client.upload_points(collection_name=self.collection_name, points=points, batch_size=128, wait=wait)
+        if stale_ids:
+            self.client.delete(collection_name=self.collection_name, points_selector=PointIdsList(points=stale_ids), wait=wait)
+
+    def barrier(self):
+        with self.lock:
+            self._submit()
+            futures, self.futures = self.futures, []
+        failed = []
+        for urls, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Qdrant write failed for {len(urls)} pages: {e}")
+                failed.extend(urls)
+        # Updates are applied in order, so waiting on one last (idempotent) write covers all the wait=False ones
+        if futures and self.last_point is not None:
+            try:
+                self._write([self.last_point], [], wait=True)
+            except Exception as e:
+                logger.error(f"Qdrant consistency barrier failed: {e}")
+                failed.extend(url for urls, _ in futures for url in urls)
+        return sorted(set(failed))
+
+
+def sync_pages(client, embed, pages, source_type="website", collection_name=COLLECTION_NAME, lexical_index=None, sink=None):
+    """
+    Diff each page's chunks against what Qdrant already holds for that URL.
+    pages: iterable of (url, chunks) or (url, chunks, extra_payload).
+    1. Only chunks with new IDs are embedded -- in one call across all pages, so the embedder
+       sees full batches (embed: list[str] -> list[list[float]]) -- and upserted.
+    2. Stale IDs are deleted by ID *after* the upsert, so a page is never missing from search.
+    3. The BM25 lexical_index, if given, gets the same adds and deletes.
+    With a QdrantSink the writes are handed off instead of made inline.
+    Returns (added, removed).
+    """
+    pages = list(pages)
+    with span("diff"):
+        existing = existing_chunk_ids(client, [page[0] for page in pages], collection_name)
+    new_points = []  # (point_id, text, payload)
+    stale_ids = []
+    for url, chunks, *extra in pages:
+        wanted = {}
+        for text in chunks:
+            wanted.setdefault(chunk_id(url, text), text)
+
+        current = existing[url]
+        for point_id, text in wanted.items():
+            if point_id not in current:
+                payload = {"text": text, "source_type": source_type, "url": url}
+                payload.update(extra[0] if extra else {})
+                new_points.append((point_id, text, payload))
+        stale_ids.extend(current - wanted.keys())
+
+    points = []
+    if new_points:
+        with span("embed"):
+            vectors = embed([text for _, text, _ in new_points])
+        points = [PointStruct(id=point_id, vector=vector, payload=payload)
+                  for (point_id, _, payload), vector in zip(new_points, vectors)]
+
+    with span("upsert"):
+        if sink:
+            sink.add([page[0] for page in pages], points, stale_ids)
+        else:
+            if points:
+                client.upsert(collection_name=collection_name, points=points)
+            if stale_ids:
+                client.delete(collection_name=collection_name, points_selector=PointIdsList(points=stale_ids))
+
+    if lexical_index is not None:
+        with span("lexical_index"):
+            lexical_index.add_documents((point_id, payload) for point_id, _, payload in new_points)
+            if stale_ids:
+                lexical_index.remove_documents(stale_ids)
+
+    return len(new_points), len(stale_ids)
+
+
+def remove_pages_outside(client, keep_urls, source_type="website", collection_name=COLLECTION_NAME, lexical_index=None):
+    """
+    Deletes source_type points whose URL is not in keep_urls: pages that dropped out of the crawl,
+    points stored under a URL form normalize_url no longer produces (e.g. ".../admissions/"), and
+    points with no url at all. Returns the removed URLs.
+    """
+    legacy_filter = Filter(
+        must=[FieldCondition(key="source_type", match=MatchValue(value=source_type))],
+        must_not=[FieldCondition(key="url", match=MatchAny(any=list(keep_urls)))],
+    )
+    legacy_ids, legacy_urls, offset = [], set(), None
+    while True:
+        points, offset = client.scroll(collection_name=collection_name, scroll_filter=legacy_filter, limit=256, offset=offset,
+                                       with_payload=["url"], with_vectors=False)
+        for point in points:
+            legacy_ids.append(point.id)
+            legacy_urls.add((point.payload or {}).get("url"))
+        if offset is None:
+            break
+    if legacy_ids:
+        client.delete(collection_name=collection_name, points_selector=PointIdsList(points=legacy_ids))
+        if lexical_index is not None:
+            lexical_index.remove_documents(legacy_ids)
+    logger.info(f"Removed {len(legacy_ids)} legacy chunks from {len(legacy_urls)} URLs.")
+    return legacy_urls - {None}
@@ -0,0 +1,171 @@
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger("TheWatcher")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 12, 16, 24, 32, 64)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labelnames, values):
+    if not labelnames:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            lines += [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in sorted(self.values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            counts, total, count = self.values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+STAGE_SECONDS = Histogram("watcher_stage_seconds", "Time spent per pipeline stage.", labelnames=("pipeline", "stage"))
+STAGE_ERRORS = Counter("watcher_stage_errors_total", "Exceptions raised inside a pipeline stage.", ("pipeline", "stage", "error"))
+CACHE_REQUESTS = Counter("watcher_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+RETRIEVED_CHUNKS = Histogram("watcher_retrieved_chunks", "Chunks handed to the LLM per question.", COUNT_BUCKETS, ("source",))
+RETRIEVAL_SCORES = Histogram("watcher_retrieval_score", "Cosine scores of vector hits.", SCORE_BUCKETS)
+LLM_TOKENS = Histogram("watcher_llm_tokens", "Tokens per LLM call.", TOKEN_BUCKETS, ("call", "kind"))
+CONTEXT_TOKENS = Histogram("watcher_context_tokens", "Estimated tokens of archive context per prompt.", TOKEN_BUCKETS)
+ADMISSIONS = Counter("watcher_admission_total", "Admission decisions for interactions (and degraded rewrites).", ("decision",))
+ADMISSION_WAIT = Histogram("watcher_admission_wait_seconds", "Time admitted interactions wait for an answer worker.")
+INTERACTIONS = Counter("watcher_interactions_total", "Answered interactions by outcome.", ("outcome",))
+WEBHOOK_EDITS = Counter("watcher_webhook_edits_total", "Discord webhook edits by HTTP status.", ("status",))
+INGESTED_PAGES = Counter("watcher_ingested_pages_total", "Crawled pages by outcome.", ("outcome",))
+
+
+class Trace:
+    """Stage timings for one unit of work (an interaction, a crawled page), logged as one JSON line."""
+
+    def __init__(self, pipeline, **fields):
+        self.pipeline = pipeline
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.fields = fields
+        self.error = None
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def log(self, **fields):
+        record = {"event": self.pipeline, "trace_id": self.trace_id, **self.fields, **fields,
+                  "total_s": round(time.perf_counter() - self.started, 4),
+                  "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()}}
+        if self.error:
+            record["error"] = self.error
+        logger.info(json.dumps(record, default=str))
+
+
+_current = contextvars.ContextVar("watcher_trace", default=None)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def use_trace(trace):
+    # Spans opened in this context -- including asyncio.to_thread() calls, which copy it -- land on `trace`
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(stage, trace=None):
+    """Times the block into watcher_stage_seconds and the current (or given) trace; errors are counted and re-raised."""
+    trace = trace or _current.get()
+    pipeline = trace.pipeline if trace else "untraced"
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(pipeline=pipeline, stage=stage, error=type(e).__name__)
+        if trace and not trace.error:
+            trace.error = f"{stage}: {type(e).__name__}: {e}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, pipeline=pipeline, stage=stage)
+        if trace:
+            trace.add(stage, elapsed)
+
+
+async def timed(stage, awaitable):
+    with span(stage):
+        return await awaitable
+
+
+def record_usage(call, usage):
+    # Groq reports usage on completions, and on the last chunk's x_groq when streaming
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        tokens = getattr(usage, kind, None)
+        if tokens is not None:
+            LLM_TOKENS.observe(tokens, call=call, kind=kind.split("_")[0])
+            trace = _current.get()
+            if trace:
+                trace.fields[f"{call}_{kind}"] = tokens
@@ -0,0 +1,82 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", str(6 * 3600)))
+# Semantic tier: reuse an entry whose original question embeds within this cosine similarity. 0 disables it.
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.92"))
+
+
+def normalize_query(text):
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class QueryCache:
+    """
+    LRU + TTL cache of user question -> (optimized keywords, query vector).
+    Exact hits are keyed on the normalized question; the optional semantic tier compares the
+    question's own embedding against the cached ones.
+    """
+
+    def __init__(self, max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL, similarity=QUERY_CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.entries = OrderedDict()  # key -> (expires_at, keywords, vector, probe)
+        self.lock = threading.Lock()
+
+    @property
+    def semantic(self):
+        return self.similarity > 0
+
+    def get(self, query):
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def get_similar(self, probe):
+        if not self.semantic or probe is None:
+            return None
+        probe = np.asarray(probe, dtype=np.float32)
+        probe = probe / (np.linalg.norm(probe) or 1.0)
+        now = time.monotonic()
+        best_key, best_score = None, self.similarity
+        with self.lock:
+            for key, (expires_at, _, _, cached_probe) in list(self.entries.items()):
+                if expires_at < now:
+                    del self.entries[key]
+                    continue
+                if cached_probe is None:
+                    continue
+                score = float(np.dot(probe, cached_probe))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self.entries.move_to_end(best_key)
+            entry = self.entries[best_key]
+            return entry[1], entry[2]
+
+    def put(self, query, keywords, vector, probe=None):
+        if probe is not None:
+            probe = np.asarray(probe, dtype=np.float32)
+            probe = probe / (np.linalg.norm(probe) or 1.0)
+        key = normalize_query(query)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, keywords, vector, probe)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
@@ -0,0 +1,44 @@
+import json
+import time
+import asyncio
+
+import httpx
+
+import crawler
+from ingest_state import PageState
+
+STORED = "https://example.edu/admissions"
+FAILING = "https://example.edu/fee"
+
+
+def test_write_lost_while_handle_runs_is_never_confirmed(tmp_path, monkeypatch):
+    # A checkpoint barrier (triggered by FAILING finishing) flushes STORED's batch while handle() is
+    # still running and reports it lost; the final barrier must not then save STORED's hash.
+    in_handle = set()
+
+    async def fake_fetch(client, url, buckets, headers=None):
+        if url == FAILING:
+            await asyncio.sleep(0.1)
+            return httpx.Response(500)
+        return httpx.Response(200, content=b"<p>Admissions open in June.</p>")
+
+    def handle(pages):
+        in_handle.update(url for url, _ in pages)
+        time.sleep(0.3)
+        in_handle.clear()
+
+    def finalize():
+        return sorted(in_handle)
+
+    checkpoints = []
+    monkeypatch.setattr(crawler, "fetch", fake_fetch)
+    state = PageState(str(tmp_path / "state.json"))
+    stats = crawler.run_ingestion([STORED, FAILING], lambda url, content: ["Admissions open in June."], handle,
+                                  concurrency=2, state=state, finalize=finalize, checkpoint_every=1,
+                                  checkpoint=lambda entries, progress: checkpoints.extend(entries))
+
+    with open(tmp_path / "state.json", encoding="utf-8") as f:
+        saved = json.load(f)["pages"]
+    assert "hash" not in saved.get(STORED, {})
+    assert dict(checkpoints)[STORED] == "failed"
+    assert stats["stored"] == 0 and stats["failed"] == 2
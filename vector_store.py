@@ -0,0 +1,236 @@
+import os
+import json
+import asyncio
+import threading
+from functools import lru_cache
+
+import numpy as np
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import Record, ScoredPoint, CountResult, PointIdsList, FilterSelector, MatchValue, MatchAny
+
+BACKENDS = ("remote", "local", "memory")  # Qdrant server at QDRANT_URL | embedded Qdrant on disk | in-process numpy index
+
+
+def _matches(payload, condition_filter):
+    """Evaluates the must / must_not FieldCondition(MatchValue | MatchAny) filters this repo uses."""
+    if condition_filter is None:
+        return True
+
+    def hit(condition):
+        value = payload.get(condition.key)
+        if isinstance(condition.match, MatchValue):
+            return value == condition.match.value
+        if isinstance(condition.match, MatchAny):
+            return value in condition.match.any
+        raise ValueError(f"Unsupported filter on {condition.key}")
+
+    return all(hit(c) for c in condition_filter.must or []) and not any(hit(c) for c in condition_filter.must_not or [])
+
+
+class NumpyVectorStore:
+    """
+    Brute-force cosine index for a corpus of a few thousand chunks: one normalized float32 matrix
+    (mmap'd from vectors.npy) plus ids/payloads in meta.json. Implements the slice of the
+    QdrantClient API used by ingestion and retrieval, so it can stand in for either.
+    Readers in other processes pick up new writes on their next search.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.RLock()
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.ids, self.payloads, self.rows = [], [], {}
+        self.loaded_at = None
+        os.makedirs(directory, exist_ok=True)
+        self._reload()
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, "meta.json")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, "vectors.npy")
+
+    def _reload(self):
+        if not os.path.exists(self._meta_path):
+            return
+        mtime = os.path.getmtime(self._meta_path)
+        if mtime == self.loaded_at:
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids, self.payloads = meta["ids"], meta["payloads"]
+        self.rows = {point_id: row for row, point_id in enumerate(self.ids)}
+        self.vectors = np.load(self._vectors_path, mmap_mode="r") if self.ids else np.zeros((0, 0), dtype=np.float32)
+        self.loaded_at = mtime
+
+    def _save(self):
+        np.save(self._vectors_path + ".tmp.npy", np.ascontiguousarray(self.vectors))
+        os.replace(self._vectors_path + ".tmp.npy", self._vectors_path)
+        with open(self._meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "payloads": self.payloads}, f)
+        os.replace(self._meta_path + ".tmp", self._meta_path)
+        self.loaded_at = os.path.getmtime(self._meta_path)
+
+    # --- collection management (single collection; names are accepted and ignored) ---
+
+    def collection_exists(self, collection_name):
+        return True
+
+    def create_collection(self, collection_name, vectors_config=None, **kwargs):
+        pass
+
+    def create_payload_index(self, collection_name, field_name, field_schema=None, **kwargs):
+        pass
+
+    def count(self, collection_name, **kwargs):
+        with self.lock:
+            self._reload()
+            return CountResult(count=len(self.ids))
+
+    def close(self):
+        pass
+
+    # --- writes ---
+
+    def upsert(self, collection_name, points, wait=True, **kwargs):
+        points = list(points)
+        if not points:
+            return
+        with self.lock:
+            self._reload()
+            new = np.asarray([point.vector for point in points], dtype=np.float32)
+            new /= np.maximum(np.linalg.norm(new, axis=1, keepdims=True), 1e-12)
+            vectors = np.array(self.vectors) if len(self.ids) else np.zeros((0, new.shape[1]), dtype=np.float32)
+            appended = []
+            for point, vector in zip(points, new):
+                point_id = str(point.id)
+                if point_id in self.rows:
+                    vectors[self.rows[point_id]] = vector
+                    self.payloads[self.rows[point_id]] = point.payload
+                else:
+                    self.rows[point_id] = len(self.ids)
+                    self.ids.append(point_id)
+                    self.payloads.append(point.payload)
+                    appended.append(vector)
+            self.vectors = np.vstack([vectors] + ([np.asarray(appended)] if appended else []))
+            self._save()
+
+    def upload_points(self, collection_name, points, batch_size=64, wait=True, **kwargs):
+        self.upsert(collection_name, points)
+
+    def delete(self, collection_name, points_selector, wait=True, **kwargs):
+        with self.lock:
+            self._reload()
+            if isinstance(points_selector, PointIdsList):
+                doomed = {str(point_id) for point_id in points_selector.points}
+            else:
+                condition_filter = points_selector.filter if isinstance(points_selector, FilterSelector) else points_selector
+                doomed = {point_id for point_id, payload in zip(self.ids, self.payloads) if _matches(payload, condition_filter)}
+            keep = [row for row, point_id in enumerate(self.ids) if point_id not in doomed]
+            if len(keep) == len(self.ids):
+                return
+            self.vectors = np.array(self.vectors)[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+            self.ids = [self.ids[row] for row in keep]
+            self.payloads = [self.payloads[row] for row in keep]
+            self.rows = {point_id: row for row, point_id in enumerate(self.ids)}
+            self._save()
+
+    # --- reads ---
+
+    def _select_payload(self, payload, with_payload):
+        if with_payload is True:
+            return payload
+        if with_payload:
+            return {key: payload[key] for key in with_payload if key in payload}
+        return None
+
+    def scroll(self, collection_name, scroll_filter=None, limit=10, offset=None, with_payload=True, with_vectors=False, **kwargs):
+        with self.lock:
+            self._reload()
+            matching = [row for row, payload in enumerate(self.payloads) if _matches(payload, scroll_filter)]
+            start = offset or 0
+            page = matching[start:start + limit]
+            records = [Record(id=self.ids[row], payload=self._select_payload(self.payloads[row], with_payload),
+                              vector=self.vectors[row].tolist() if with_vectors else None) for row in page]
+            return records, (start + limit if start + limit < len(matching) else None)
+
+    def search(self, collection_name, query_vector, limit=10, query_filter=None, with_payload=True, score_threshold=None, **kwargs):
+        with self.lock:
+            self._reload()
+            if not self.ids:
+                return []
+            query = np.asarray(query_vector, dtype=np.float32)
+            scores = self.vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+            if query_filter is not None:
+                allowed = np.array([_matches(payload, query_filter) for payload in self.payloads])
+                scores = np.where(allowed, scores, -np.inf)
+            limit = min(limit, len(self.ids))
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top])]
+            return [ScoredPoint(id=self.ids[row], version=0, score=float(scores[row]), payload=self._select_payload(self.payloads[row], with_payload))
+                    for row in top if np.isfinite(scores[row]) and (score_threshold is None or scores[row] >= score_threshold)]
+
+
+class ThreadedAsyncStore:
+    """Async face for in-process stores (embedded Qdrant allows only one client per storage folder)."""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def search(self, **kwargs):
+        return await asyncio.to_thread(self.store.search, **kwargs)
+
+    async def close(self):
+        pass
+
+
+@lru_cache(maxsize=None)
+def _embedded_qdrant(path):
+    return QdrantClient(path=path)
+
+
+@lru_cache(maxsize=None)
+def _numpy_store(directory):
+    return NumpyVectorStore(directory)
+
+
+def vector_backend():
+    # Read at call time so entry points can load_dotenv() after importing this module
+    backend = os.getenv("VECTOR_BACKEND", "remote")
+    if backend not in BACKENDS:
+        raise ValueError(f"VECTOR_BACKEND must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    return backend
+
+
+def store_location():
+    """(backend, target) naming the store ingestion writes to; the target is a server URL or an absolute path."""
+    backend = vector_backend()
+    if backend == "local":
+        return backend, os.path.abspath(os.getenv("QDRANT_PATH", "qdrant_data"))
+    if backend == "memory":
+        return backend, os.path.abspath(os.getenv("VECTOR_INDEX_DIR", "vector_index"))
+    return backend, os.getenv("QDRANT_URL", "")
+
+
+_open_lock = threading.Lock()  # a second embedded client on the same folder fails, so opening is single-flight
+
+
+def open_vector_store(prefer_grpc=False, timeout=60):
+    """Sync client for the configured backend; in-process backends are shared per process."""
+    backend = vector_backend()
+    if backend == "local":
+        with _open_lock:
+            return _embedded_qdrant(os.getenv("QDRANT_PATH", "qdrant_data"))
+    if backend == "memory":
+        with _open_lock:
+            return _numpy_store(os.getenv("VECTOR_INDEX_DIR", "vector_index"))
+    return QdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"), prefer_grpc=prefer_grpc, timeout=timeout)
+
+
+def open_async_vector_store(store=None):
+    """Async client for the query path: a real AsyncQdrantClient for a server, otherwise the shared in-process store."""
+    if vector_backend() == "remote":
+        return AsyncQdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
+    return ThreadedAsyncStore(store or open_vector_store())